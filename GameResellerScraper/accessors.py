@@ -0,0 +1,107 @@
+import re
+from functools import lru_cache
+from typing import Any, Optional
+
+_STEP = re.compile(r"""\[(-?\d+)\]|\[\s*['"]?([^\]'"]+?)['"]?\s*\]|([^.\[\]]+)""")
+
+
+class Accessor:
+    """A pre-split path into the React Query payload.
+
+    Paths are dotted keys with two extra step types, matching the notation used in the
+    `spiders/game-item.py` docstrings:
+        - `configuration[1]` indexes a list
+        - `configuration['configs.productDisplayName=$title']` selects the first list
+          element whose nested value equals the literal after `=`, or the keyword
+          argument passed to `get` when the literal starts with `$`
+    """
+
+    __slots__ = ("path", "steps", "keys")
+
+    path: str
+    steps: tuple[tuple[Any, ...], ...]
+    keys: Optional[tuple[str, ...]]
+
+    def __init__(self, path: str, delimiter: str = "."):
+        self.path = path
+        if delimiter != "." or "[" not in path:
+            self.steps = tuple(("key", key) for key in path.split(delimiter))
+        else:
+            self.steps = tuple(parse_steps(path))
+        # plain dotted paths are by far the most common, walk them without dispatching
+        # on the step type
+        self.keys = (
+            tuple(step[1] for step in self.steps)
+            if all(step[0] == "key" for step in self.steps)
+            else None
+        )
+
+    def get(self, d: Any, **params: Any) -> Any:
+        if not d:
+            return None
+        result = d
+        if self.keys is not None:
+            for key in self.keys:
+                if not isinstance(result, dict):
+                    return None
+                result = result.get(key)
+                if result is None:
+                    return None
+            return result
+
+        for step in self.steps:
+            kind = step[0]
+            if kind == "key":
+                if not isinstance(result, dict):
+                    return None
+                result = result.get(step[1])
+            elif kind == "index":
+                if not isinstance(result, list) or not -len(result) <= step[1] < len(result):
+                    return None
+                result = result[step[1]]
+            else:
+                if not isinstance(result, list):
+                    return None
+                _, accessor, expected = step
+                if expected.startswith("$"):
+                    expected = params.get(expected[1:])
+                result = next((x for x in result if accessor.get(x) == expected), None)
+            if result is None:
+                return None
+        return result
+
+    def __repr__(self):
+        return f"Accessor({self.path!r})"
+
+
+def parse_steps(path: str):
+    for part in split_path(path):
+        for match in _STEP.finditer(part):
+            index, predicate, key = match.groups()
+            if index is not None:
+                yield ("index", int(index))
+            elif predicate is not None:
+                subpath, _, expected = predicate.partition("=")
+                yield ("match", compile_path(subpath.strip()), expected.strip())
+            else:
+                yield ("key", key)
+
+
+def split_path(path: str):
+    """Split on dots that are not inside a [...] step"""
+    depth = 0
+    start = 0
+    for i, char in enumerate(path):
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == "." and depth == 0:
+            yield path[start:i]
+            start = i + 1
+    yield path[start:]
+
+
+@lru_cache(maxsize=None)
+def compile_path(path: str, delimiter: str = ".") -> Accessor:
+    return Accessor(path, delimiter)
@@ -0,0 +1,67 @@
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Optional
+
+from scrapy.http.request.json_request import json
+
+
+class ResponseArchive:
+    """Append-only archive of recorded responses.
+
+    `records.bin` holds one zlib-compressed record per response: a JSON header line
+    (url, status, headers) followed by the raw body. `index.jsonl` maps each key to
+    the offset and length of its record, a key recorded twice points to the newest
+    record.
+    """
+
+    index: dict[str, tuple[int, int]]
+    records: BinaryIO
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = Path(path)
+        self.writable = writable
+        if writable:
+            self.path.mkdir(parents=True, exist_ok=True)
+        self.index = {}
+        index_path = self.path / "index.jsonl"
+        if index_path.exists():
+            with open(index_path, encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.index[entry["key"]] = (entry["offset"], entry["length"])
+        self.records = open(self.path / "records.bin", "a+b" if writable else "rb")
+        self.index_file = open(index_path, "a", encoding="utf-8") if writable else None
+
+    def __contains__(self, key: str):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key: str) -> Optional[tuple[dict[str, Any], bytes]]:
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        offset, length = entry
+        __ = self.records.seek(offset)
+        record = zlib.decompress(self.records.read(length))
+        header, _, body = record.partition(b"\n")
+        return json.loads(header), body
+
+    def put(self, key: str, header: dict[str, Any], body: bytes):
+        if self.index_file is None:
+            raise ValueError(f"{self.path} is opened read-only")
+        record = zlib.compress(json.dumps(header).encode() + b"\n" + body)
+        offset = self.records.seek(0, 2)
+        __ = self.records.write(record)
+        self.records.flush()
+        self.index[key] = (offset, len(record))
+        __ = self.index_file.write(
+            json.dumps({"key": key, "offset": offset, "length": len(record)}) + "\n"
+        )
+        self.index_file.flush()
+
+    def close(self):
+        self.records.close()
+        if self.index_file is not None:
+            self.index_file.close()
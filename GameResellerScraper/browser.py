@@ -0,0 +1,312 @@
+"""Request profile for the playwright-rendered fallback.
+
+ItemParser1 only reads the __REACT_QUERY_INITIAL_QUERIES__ script that is part of the
+server-rendered HTML, so a rendered page doesn't need its images, media, fonts or
+anything served from another host. AbortProfile is set as PLAYWRIGHT_ABORT_REQUEST and
+aborts those routes, the PlaywrightProfile extension reports what it saved: the
+Content-Length of an aborted request when it has one, otherwise the size of its resource
+type in PLAYWRIGHT_ABORT_BASELINE_BYTES.
+
+ContextPoolMiddleware keeps rendered pages in a fixed set of browser contexts with
+reusable pages, and replaces a context once it has served enough navigations or the
+browser has grown past an RSS limit, so long crawls don't keep growing Firefox.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Iterable, Optional
+from urllib.parse import urlsplit
+
+from scrapy import Request, Spider, signals
+from scrapy.crawler import Crawler
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Response
+from scrapy.statscollectors import StatsCollector
+
+from GameResellerScraper.metrics import observe
+
+logger = logging.getLogger(__name__)
+
+
+class AbortProfile:
+    """PLAYWRIGHT_ABORT_REQUEST predicate: abort requests of `resource_types`, and
+    requests to hosts outside `hosts` (a host matches itself and its subdomains)"""
+
+    stats: Optional[StatsCollector]
+    baseline: dict[str, int]
+
+    def __init__(self, resource_types: Iterable[str], hosts: Iterable[str]):
+        self.resource_types = frozenset(resource_types)
+        self.hosts = tuple(hosts)
+        # set by the PlaywrightProfile extension, the handler only gets the predicate
+        self.stats = None
+        self.baseline = {}
+
+    def __call__(self, request: Any) -> bool:
+        resource_type: str = request.resource_type
+        if resource_type in self.resource_types:
+            reason = "resource_type"
+        elif not self.first_party(request.url):
+            reason = "third_party"
+        else:
+            return False
+        if self.stats is not None:
+            self.stats.inc_value(f"playwright_profile/aborted/{reason}/{resource_type}")
+            self.stats.inc_value("playwright_profile/bytes_saved", self.saved_bytes(request))
+        return True
+
+    def saved_bytes(self, request: Any) -> int:
+        """Size of an aborted request: its Content-Length when known, otherwise the
+        baseline size of its resource type"""
+        length = request.headers.get("content-length")
+        if length is not None and length.isdigit():
+            return int(length)
+        if self.stats is not None:
+            self.stats.inc_value("playwright_profile/bytes_saved/estimated")
+        return self.baseline.get(request.resource_type, 0)
+
+    def first_party(self, url: str) -> bool:
+        host = urlsplit(url).hostname or ""
+        return any(host == allowed or host.endswith(f".{allowed}") for allowed in self.hosts)
+
+
+class PlaywrightProfile:
+    """Connects the AbortProfile to the crawl stats and records, per rendered page,
+    the time until the payload was available and the bytes of the rendered document"""
+
+    def __init__(self, stats: Optional[StatsCollector]):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        extension = cls(crawler.stats)
+        profile = crawler.settings.get("PLAYWRIGHT_ABORT_REQUEST")
+        if isinstance(profile, AbortProfile):
+            profile.stats = crawler.stats
+            profile.baseline = {
+                resource_type: int(size)
+                for resource_type, size in crawler.settings.getdict(
+                    "PLAYWRIGHT_ABORT_BASELINE_BYTES"
+                ).items()
+            }
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        return extension
+
+    def response_received(self, response: Response, request: Request, spider: Spider):
+        if self.stats is None or "playwright" not in response.flags:
+            return
+        self.stats.inc_value("playwright_profile/document_bytes", len(response.body))
+        # scrapy-playwright's download_latency spans goto, the page methods and reading
+        # the page content, which is when the payload became available to us
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            observe(self.stats, "playwright/time_to_payload", latency)
+
+
+# what Cloudflare answers a challenged plain HTTP request with. These responses are
+# passed to the callback, where the missing query script sends the page to playwright
+CHALLENGE_STATUSES = [403, 429, 503]
+
+
+def http_meta(fallback: bool = True) -> dict[str, Any]:
+    """Request meta of a page fetched over plain HTTP, rendered only as a fallback. With
+    a fallback the attempt isn't retried: a challenged or failed page goes straight to
+    playwright instead of RetryMiddleware fetching 429 and 503 again first"""
+    return {
+        "playwright": False,
+        "handle_httpstatus_list": CHALLENGE_STATUSES,
+        "dont_retry": fallback,
+    }
+
+
+def render_meta(wait_until: str = "domcontentloaded") -> dict[str, Any]:
+    """Request meta of a rendered page, which is retried as usual"""
+    return {
+        "playwright": True,
+        "playwright_page_goto_kwargs": {"wait_until": wait_until},
+        "dont_retry": False,
+    }
+
+
+class PooledContext:
+    """One generation of a pool slot: a named browser context and its idle pages. A
+    retired generation takes no new requests and is closed once its pages are back."""
+
+    __slots__ = ("name", "navigations", "in_flight", "idle", "context", "retired")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.navigations = 0
+        self.in_flight = 0
+        self.idle: list[Any] = []
+        self.context: Any = None
+        self.retired = False
+
+
+class ContextPoolMiddleware:
+    """Routes rendered requests to PLAYWRIGHT_POOL_CONTEXTS contexts of at most
+    PLAYWRIGHT_POOL_PAGES_PER_CONTEXT pages. Pages are kept open between requests and
+    handed to the next one through the `playwright_page` meta. A context is recycled
+    under a new name after PLAYWRIGHT_CONTEXT_MAX_NAVIGATIONS navigations, or when the
+    browser processes use more than PLAYWRIGHT_BROWSER_MAX_RSS bytes."""
+
+    leases: dict[Request, PooledContext]
+
+    def __init__(
+        self,
+        stats: Optional[StatsCollector],
+        contexts: int,
+        pages: int,
+        max_navigations: int = 0,
+        max_rss: int = 0,
+        rss_interval: float = 30.0,
+    ):
+        self.stats = stats
+        self.pages = pages
+        self.max_navigations = max_navigations
+        self.max_rss = max_rss
+        self.rss_interval = rss_interval
+        self.rss_checked = time.monotonic()
+        self.generation = 0
+        self.slots = [self.new_context(index) for index in range(contexts)]
+        self.capacity = asyncio.Semaphore(contexts * pages)
+        self.leases = {}
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        settings = crawler.settings
+        contexts = settings.getint("PLAYWRIGHT_POOL_CONTEXTS")
+        pages = settings.getint("PLAYWRIGHT_POOL_PAGES_PER_CONTEXT")
+        if contexts <= 0 or pages <= 0:
+            raise NotConfigured("PLAYWRIGHT_POOL_CONTEXTS and PLAYWRIGHT_POOL_PAGES_PER_CONTEXT")
+        return cls(
+            crawler.stats,
+            contexts,
+            pages,
+            max_navigations=settings.getint("PLAYWRIGHT_CONTEXT_MAX_NAVIGATIONS"),
+            max_rss=settings.getint("PLAYWRIGHT_BROWSER_MAX_RSS"),
+            rss_interval=settings.getfloat("PLAYWRIGHT_RSS_CHECK_INTERVAL", 30.0),
+        )
+
+    def new_context(self, index: int) -> PooledContext:
+        self.generation += 1
+        return PooledContext(f"pool-{index}-{self.generation}")
+
+    async def process_request(self, request: Request, spider: Spider):
+        if not request.meta.get("playwright"):
+            return None
+        # waits for a free page, the handler would otherwise block on its own page
+        # semaphore while idle pages of the pool hold every slot
+        await self.capacity.acquire()
+        pooled = min(self.slots, key=lambda slot: slot.in_flight)
+        pooled.in_flight += 1
+        self.leases[request] = pooled
+
+        page = None
+        while pooled.idle and page is None:
+            page = pooled.idle.pop()
+            if page.is_closed():
+                page = None
+        if page is not None and self.stats is not None:
+            self.stats.inc_value("playwright_pool/pages_reused")
+        request.meta["playwright_context"] = pooled.name
+        request.meta["playwright_include_page"] = True
+        request.meta["playwright_page"] = page
+        return None
+
+    async def process_response(self, request: Request, response: Response, spider: Spider):
+        await self.release(request)
+        return response
+
+    async def process_exception(self, request: Request, exception: Exception, spider: Spider):
+        await self.release(request)
+        return None
+
+    async def release(self, request: Request):
+        pooled = self.leases.pop(request, None)
+        if pooled is None:
+            return
+        # popped so the page doesn't travel on with the response or a retried request
+        page = request.meta.pop("playwright_page", None)
+        pooled.in_flight -= 1
+        self.capacity.release()
+        if page is not None:
+            pooled.navigations += 1
+            pooled.context = page.context
+            if pooled.retired or page.is_closed():
+                await close_quietly(page)
+            else:
+                pooled.idle.append(page)
+
+        if not pooled.retired:
+            if self.max_navigations and pooled.navigations >= self.max_navigations:
+                self.recycle(pooled, "navigations")
+            elif self.max_rss and self.rss_due():
+                rss = browser_rss()
+                if self.stats is not None:
+                    self.stats.max_value("playwright_pool/browser_rss_max", rss)
+                if rss > self.max_rss:
+                    self.recycle(max(self.slots, key=lambda slot: slot.navigations), "rss")
+        if pooled.retired and pooled.in_flight == 0 and pooled.context is not None:
+            await close_quietly(pooled.context)
+            pooled.context = None
+
+    def recycle(self, pooled: PooledContext, reason: str):
+        index = self.slots.index(pooled)
+        self.slots[index] = self.new_context(index)
+        pooled.retired = True
+        if self.stats is not None:
+            self.stats.inc_value(f"playwright_pool/recycled/{reason}")
+
+    def rss_due(self) -> bool:
+        now = time.monotonic()
+        if now - self.rss_checked < self.rss_interval:
+            return False
+        self.rss_checked = now
+        return True
+
+
+async def close_quietly(target: Any):
+    """Close a page or context that may already be gone with the browser"""
+    try:
+        await target.close()
+    except Exception as err:
+        logger.debug(f"playwright pool -> closing {target} failed: {err}")
+
+
+def browser_rss() -> int:
+    """Resident memory of the processes started by this crawl, in bytes: the playwright
+    driver and the browser under it. Python children (the parse pool) are left out.
+    Linux only, 0 where /proc isn't available."""
+    parents: dict[int, int] = {}
+    commands: dict[int, str] = {}
+    for entry in Path("/proc").glob("[0-9]*"):
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # the command is in parentheses and may itself contain spaces
+        command, _, rest = stat.partition(" (")[2].rpartition(") ")
+        parents[int(entry.name)] = int(rest.split()[1])
+        commands[int(entry.name)] = command
+
+    descendants: list[int] = []
+    pending = [os.getpid()]
+    while pending:
+        pid = pending.pop()
+        for child, parent in parents.items():
+            if parent == pid and not commands[child].startswith("python"):
+                descendants.append(child)
+                pending.append(child)
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    rss = 0
+    for pid in descendants:
+        try:
+            rss += int((Path("/proc") / str(pid) / "statm").read_text().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return rss
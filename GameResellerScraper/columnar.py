@@ -0,0 +1,174 @@
+"""Parquet datasets of items and their child collections, for columnar scans.
+
+One dataset per table MysqlPipline writes: items, images, reviews, polls and
+system_details, with the columns of the matching INSERT. The database ids don't exist
+here, so child rows carry their item's (item_ref_namespace, item_ref_id) instead of
+item_id, and system_details rows carry the os of their systems row.
+
+Files are laid out as hive partitions, `<root>/<dataset>/crawl_date=YYYY-MM-DD/
+part-<crawl id>.parquet`, one file per crawl and day, one row group per flush.
+pyarrow is imported lazily: it is only needed when PARQUET_EXPORT_PATH is set.
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from GameResellerScraper.items import GameItem
+from GameResellerScraper.writer import (
+    ITEM_COLUMNS,
+    image_rows,
+    item_key,
+    item_row,
+    poll_rows,
+    review_rows,
+    system_details,
+)
+
+ITEM_KEY_COLUMNS = (("item_ref_namespace", "string"), ("item_ref_id", "string"))
+
+ITEM_TYPES = {
+    "critic_avg": "float64",
+    "critic_recommend_pct": "float64",
+    "sale_price": "int64",
+    "release_date": "timestamp",
+    "avg_rating": "float64",
+}
+
+# (column, type) of every dataset, in the order its rows are built below
+COLUMNS: dict[str, tuple[tuple[str, str], ...]] = {
+    "items": tuple((column, ITEM_TYPES.get(column, "string")) for column in ITEM_COLUMNS),
+    "images": ITEM_KEY_COLUMNS
+    + (("url", "string"), ("image_type", "string"), ("alt", "string"), ("image_row", "int64")),
+    "reviews": ITEM_KEY_COLUMNS
+    + (
+        ("author", "string"),
+        ("body", "string"),
+        ("outlet", "string"),
+        ("earned_score", "float64"),
+        ("total_score", "float64"),
+        ("type", "string"),
+        ("url", "string"),
+    ),
+    "polls": ITEM_KEY_COLUMNS
+    + (
+        ("text", "string"),
+        ("emoji", "string"),
+        ("result_emoji", "string"),
+        ("result_title", "string"),
+        ("result_text", "string"),
+        ("ref_id", "int64"),
+        ("ref_tag_id", "int64"),
+        ("ref_poll_definition_id", "int64"),
+        ("total", "int64"),
+    ),
+    "system_details": ITEM_KEY_COLUMNS
+    + (("os", "string"), ("title", "string"), ("minimum", "string"), ("recommended", "string")),
+}
+
+
+def dataset_rows(item: GameItem) -> dict[str, list[tuple[Any, ...]]]:
+    """Rows of every dataset for one item, reusing the MysqlPipline row builders with the
+    item_id column swapped for the item key"""
+    key = item_key(item)
+    return {
+        "items": [item_row(item)],
+        "images": [key + row[:3] + row[4:] for row in image_rows(item, 0)],
+        "reviews": [key + row[:6] + row[7:] for row in review_rows(item, 0)],
+        "polls": [key + row[:5] + row[6:] for row in poll_rows(item, 0)],
+        "system_details": [
+            key + (os,) + row for os, rows in system_details(item).items() for row in rows
+        ],
+    }
+
+
+@lru_cache(maxsize=None)
+def schema(dataset: str) -> Any:
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(),
+        "float64": pa.float64(),
+        "int64": pa.int64(),
+        "timestamp": pa.timestamp("ms"),
+    }
+    return pa.schema([(column, types[kind]) for column, kind in COLUMNS[dataset]])
+
+
+class ColumnarBatch:
+    """Rows buffered for the next row group of each dataset"""
+
+    __slots__ = ("rows", "items")
+
+    rows: dict[str, list[tuple[Any, ...]]]
+    items: int
+
+    def __init__(self):
+        self.rows = {dataset: [] for dataset in COLUMNS}
+        self.items = 0
+
+    def add(self, item: GameItem):
+        for dataset, rows in dataset_rows(item).items():
+            self.rows[dataset].extend(rows)
+        self.items += 1
+
+    def __bool__(self):
+        return self.items > 0
+
+    def tables(self) -> dict[str, Any]:
+        import pyarrow as pa
+
+        tables: dict[str, Any] = {}
+        for dataset, rows in self.rows.items():
+            dataset_schema = schema(dataset)
+            columns = list(zip(*rows)) if rows else [[] for _ in dataset_schema]
+            tables[dataset] = pa.Table.from_arrays(
+                [
+                    pa.array(column, type=field.type)
+                    for column, field in zip(columns, dataset_schema)
+                ],
+                schema=dataset_schema,
+            )
+        return tables
+
+
+class ParquetDatasets:
+    """Open Parquet writers of one crawl, one per dataset and crawl date"""
+
+    writers: dict[tuple[str, str], Any]
+
+    def __init__(self, path: str, compression: str = "snappy", crawl_id: str = ""):
+        self.path = Path(path)
+        self.compression = compression
+        self.crawl_id = crawl_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self.writers = {}
+
+    def write(self, crawl_date: str, batch: ColumnarBatch):
+        for dataset, table in batch.tables().items():
+            if table.num_rows:
+                self.writer(dataset, crawl_date).write_table(table)
+
+    def writer(self, dataset: str, crawl_date: str) -> Any:
+        writer = self.writers.get((dataset, crawl_date))
+        if writer is None:
+            import pyarrow.parquet as pq
+
+            directory = self.path / dataset / f"crawl_date={crawl_date}"
+            directory.mkdir(parents=True, exist_ok=True)
+            writer = pq.ParquetWriter(
+                str(directory / f"part-{self.crawl_id}.parquet"),
+                schema(dataset),
+                compression=self.compression,
+            )
+            self.writers[(dataset, crawl_date)] = writer
+        return writer
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def crawl_date() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
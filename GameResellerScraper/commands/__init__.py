@@ -0,0 +1,4 @@
+# Project commands, registered through COMMANDS_MODULE
+#
+# Please refer to the documentation for information on how to create custom commands:
+# https://docs.scrapy.org/en/latest/topics/commands.html#custom-project-commands
@@ -0,0 +1,73 @@
+"""`scrapy price-history`: compact the price history or print price series.
+
+    scrapy price-history compact [--days N]
+    scrapy price-history series --item NAMESPACE/ID [--since DATE]
+    scrapy price-history series --tag TAG_ID [--since DATE]
+
+Series are printed as JSON lines, one PriceRange each, oldest first.
+"""
+
+import argparse
+import sys
+import time
+from typing import Any
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+from scrapy.http.request.json_request import json
+
+from GameResellerScraper.pricehistory import PriceHistory, PriceRange
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_ENABLED": False}
+
+    def syntax(self):
+        return "compact|series [options]"
+
+    def short_desc(self):
+        return "Compact the price history or print the price series of an item or tag"
+
+    def add_options(self, parser: argparse.ArgumentParser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--days",
+            type=float,
+            help="compact observations older than this (default: PRICE_HISTORY_RAW_DAYS)",
+        )
+        parser.add_argument("--item", metavar="NAMESPACE/ID", help="series of one item")
+        parser.add_argument("--tag", metavar="TAG_ID", help="series of every item with a tag")
+        parser.add_argument("--since", metavar="DATE", help="only from this ISO date on")
+
+    def run(self, args: list[str], opts: argparse.Namespace):
+        if len(args) != 1 or args[0] not in ("compact", "series"):
+            raise UsageError()
+        path = self.settings.get("PRICE_HISTORY_PATH")
+        if not path:
+            raise UsageError("PRICE_HISTORY_PATH is not set")
+        history = PriceHistory(path)
+        try:
+            if args[0] == "compact":
+                days = opts.days
+                if days is None:
+                    days = self.settings.getfloat("PRICE_HISTORY_RAW_DAYS", 30)
+                compacted = history.compact(time.time() - days * 24 * 60 * 60)
+                print(f"compacted {compacted} observations older than {days:g} days")
+            elif opts.item:
+                ref_namespace, _, ref_id = opts.item.partition("/")
+                if not ref_id:
+                    raise UsageError("--item takes NAMESPACE/ID")
+                self.print_series(history.series(ref_namespace, ref_id, opts.since))
+            elif opts.tag:
+                for series in history.tag_series(opts.tag, opts.since).values():
+                    self.print_series(series)
+            else:
+                raise UsageError("series needs --item or --tag")
+        finally:
+            history.close()
+
+    def print_series(self, series: list[PriceRange]):
+        for price_range in series:
+            row: dict[str, Any] = price_range._asdict()
+            __ = sys.stdout.write(json.dumps(row) + "\n")
@@ -0,0 +1,181 @@
+"""`scrapy reparse`: run ItemParser1 over the payload archive again and send the items
+through ITEM_PIPELINES, without crawling.
+
+Payloads are decoded and extracted on a process pool, one archive entry per task, and
+the items are handed to the pipelines in the order the pages were archived, so base
+games still reach MysqlPipline before their add-ons. Only the pipelines run: there is
+no engine, scheduler or downloader, the command drives ItemPipelineManager itself.
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+from scrapy import Spider
+from scrapy.commands import ScrapyCommand
+from scrapy.crawler import Crawler
+from scrapy.exceptions import DropItem, UsageError
+from scrapy.pipelines import ItemPipelineManager
+from scrapy.utils.defer import deferred_from_coro, maybe_deferred_to_future
+from scrapy.utils.log import failure_to_exc_info
+from scrapy.utils.misc import load_object
+from scrapy.utils.reactor import install_reactor
+from twisted.python.failure import Failure
+
+from GameResellerScraper.decoders import get_decoder
+from GameResellerScraper.items import GameItem, ItemRef
+from GameResellerScraper.metrics import timer
+from GameResellerScraper.offload import LocalStats, merge_stats
+from GameResellerScraper.parser import ItemParser1, QueryIndex
+from GameResellerScraper.payloads import PayloadArchive
+
+logger = logging.getLogger(__name__)
+
+
+class ReparseSpider(Spider):
+    """Stands in for game-item in the pipelines, which only use its name and logger"""
+
+    name = "reparse"
+
+
+def reparse_payload(
+    path: str, digest: str, url: str, backend: str = "stdlib"
+) -> tuple[Optional[dict[str, Any]], dict[str, Any]]:
+    """Item fields of an archived payload and the stats the parser collected. Runs in
+    a worker."""
+    stats: Any = LocalStats()
+    parser = ItemParser1(logger, decode_queries=get_decoder(backend), stats=stats)
+    slug = url.split("/")[-1]
+    with timer(stats, "reparse/worker"):
+        queries = parser.decode_queries(PayloadArchive(path).load(digest))
+        fields = parser.extract_fields(QueryIndex(queries), slug) if queries else None
+    return fields, stats.values
+
+
+class Command(ScrapyCommand):
+    requires_project = True
+    default_settings = {"LOG_LEVEL": "INFO"}
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Re-parse archived payloads into the item pipelines"
+
+    def add_options(self, parser: argparse.ArgumentParser):
+        super().add_options(parser)
+        parser.add_argument(
+            "--archive", metavar="PATH", help="payload archive (default: PAYLOAD_ARCHIVE_PATH)"
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="parse processes (default: one per core)",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="every archived page, not only the newest payload of each slug",
+        )
+        parser.add_argument(
+            "--slug", action="append", default=[], help="only this slug (may be repeated)"
+        )
+        parser.add_argument(
+            "--since", metavar="DATE", help="only pages crawled at or after this ISO date"
+        )
+
+    def run(self, args: list[str], opts: argparse.Namespace):
+        path = opts.archive or self.settings.get("PAYLOAD_ARCHIVE_PATH")
+        if not path:
+            raise UsageError("no payload archive, set PAYLOAD_ARCHIVE_PATH or --archive")
+        archive = PayloadArchive(path)
+        entries = list(archive.entries()) if opts.all else archive.latest()
+        if opts.slug:
+            entries = [entry for entry in entries if entry["slug"] in opts.slug]
+        if opts.since:
+            entries = [entry for entry in entries if entry["crawled_at"] >= opts.since]
+
+        assert self.crawler_process is not None
+        crawler = self.crawler_process.create_crawler(ReparseSpider)
+        # no engine runs, so what the pipelines need of Crawler.crawl is set up here: the
+        # TWISTED_REACTOR, before anything imports the reactor, the spider and the stats
+        if crawler.settings.get("TWISTED_REACTOR"):
+            install_reactor(
+                crawler.settings["TWISTED_REACTOR"], crawler.settings["ASYNCIO_EVENT_LOOP"]
+            )
+        crawler.spider = ReparseSpider.from_crawler(crawler)
+        crawler.stats = load_object(crawler.settings["STATS_CLASS"])(crawler)
+
+        from twisted.internet import reactor
+
+        d = deferred_from_coro(self.reparse(crawler, archive, entries, max(opts.workers, 1)))
+        d.addErrback(self.failed)
+        d.addBoth(lambda _: reactor.stop())
+        self.crawler_process.start(stop_after_crawl=False)
+
+    def failed(self, failure: Failure):
+        logger.error(
+            f"reparse -> {failure.getErrorMessage()}", exc_info=failure_to_exc_info(failure)
+        )
+        self.exitcode = 1
+
+    async def reparse(
+        self, crawler: Crawler, archive: PayloadArchive, entries: list[dict[str, Any]], workers: int
+    ):
+        spider = crawler.spider
+        assert spider is not None and crawler.stats is not None
+        stats = crawler.stats
+        stats.open_spider(spider)
+        pipelines = ItemPipelineManager.from_crawler(crawler)
+        await maybe_deferred_to_future(pipelines.open_spider(spider))
+
+        backend = crawler.settings.get("JSON_BACKEND", "stdlib")
+        logger.info(f"reparse -> {len(entries)} payloads from {archive.path} on {workers} workers")
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        pending: deque[tuple[dict[str, Any], asyncio.Future[Any]]] = deque()
+        entries_left = iter(entries)
+        try:
+            while True:
+                # keep every worker busy while the pipelines take the oldest result
+                while len(pending) < workers * 4:
+                    entry = next(entries_left, None)
+                    if entry is None:
+                        break
+                    future = executor.submit(
+                        reparse_payload, str(archive.path), entry["digest"], entry["url"], backend
+                    )
+                    pending.append((entry, asyncio.wrap_future(future)))
+                if not pending:
+                    break
+                entry, future = pending.popleft()
+                try:
+                    fields, values = await future
+                except Exception as err:
+                    logger.error(f"reparse {entry['url']} -> {err}")
+                    stats.inc_value("reparse/failed")
+                    continue
+                merge_stats(stats, values)
+                if not fields:
+                    continue
+                base = entry.get("base")
+                item = GameItem(**fields, base_item=ItemRef(**base) if base else None)
+                try:
+                    await maybe_deferred_to_future(pipelines.process_item(item, spider))
+                except DropItem as err:
+                    logger.info(f"reparse {entry['url']} -> dropped: {err}")
+                    stats.inc_value("item_dropped_count")
+                    continue
+                stats.inc_value("item_scraped_count")
+        finally:
+            executor.shutdown(cancel_futures=True)
+            await maybe_deferred_to_future(pipelines.close_spider(spider))
+            stats.close_spider(spider, reason="finished")
@@ -0,0 +1,99 @@
+"""Decoders for the __REACT_QUERY_INITIAL_QUERIES__ payload.
+
+Every decoder takes the raw JSON bytes (or a memoryview of them) and returns the
+`queries` list, raising ValueError when the payload is not valid JSON or has no
+`queries`. The backend is picked with the JSON_BACKEND setting.
+"""
+
+from typing import Any, Callable, Optional, Union
+
+from scrapy.http.request.json_request import json
+
+Payload = Union[bytes, bytearray, memoryview]
+QueriesDecoder = Callable[[Payload], list[dict[Any, Any]]]
+
+# queryKeys read by ItemParser1, the msgspec backend skips every other entry
+CONSUMED_QUERY_KEYS = frozenset(
+    {
+        "getCatalogOffer",
+        "getStoreConfig",
+        "egs-platform",
+        "getProductResult",
+        "getMappingByPageSlug",
+        "getProductHomeConfig",
+    }
+)
+
+
+def decode_stdlib(payload: Payload) -> list[dict[Any, Any]]:
+    data = json.loads(payload if isinstance(payload, (bytes, bytearray)) else bytes(payload))
+    return queries_of(data)
+
+
+def decode_orjson(payload: Payload) -> list[dict[Any, Any]]:
+    import orjson
+
+    return queries_of(orjson.loads(payload))
+
+
+def decode_msgspec(payload: Payload) -> list[dict[Any, Any]]:
+    import msgspec
+
+    decoder, state_decoder, generic_decoder = msgspec_decoders()
+    queries: list[dict[Any, Any]] = []
+    for query in decoder.decode(payload).queries:
+        key = query.queryKey
+        name = key[0] if isinstance(key, list) and key else key
+        if name not in CONSUMED_QUERY_KEYS:
+            continue
+        try:
+            state = state_decoder.decode(query.state)
+            data = msgspec.to_builtins(state.data) if state and state.data is not None else None
+        except msgspec.ValidationError:
+            # a state whose shape doesn't match the structs is decoded as it is
+            state = generic_decoder.decode(query.state)
+            data = state.get("data") if isinstance(state, dict) else None
+        queries.append({"queryKey": key, "state": {"data": data}})
+
+    return queries
+
+
+_msgspec_decoders: Any = None
+
+
+def msgspec_decoders():
+    """Decoders into the structs of GameResellerScraper.structs: the queries list, with
+    each state kept as an undecoded msgspec.Raw slice, and the state of a query
+    ItemParser1 reads"""
+    global _msgspec_decoders
+    if _msgspec_decoders is None:
+        import msgspec
+
+        from GameResellerScraper.structs import Queries, State
+
+        _msgspec_decoders = (
+            msgspec.json.Decoder(Queries),
+            msgspec.json.Decoder(Optional[State]),
+            msgspec.json.Decoder(),
+        )
+    return _msgspec_decoders
+
+
+def queries_of(data: Any) -> list[dict[Any, Any]]:
+    if not isinstance(data, dict) or not isinstance(data.get("queries"), list):
+        raise ValueError("no queries in payload")
+    return data["queries"]
+
+
+BACKENDS: dict[str, QueriesDecoder] = {
+    "stdlib": decode_stdlib,
+    "orjson": decode_orjson,
+    "msgspec": decode_msgspec,
+}
+
+
+def get_decoder(name: str = "stdlib") -> QueriesDecoder:
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown JSON_BACKEND {name!r}, expected one of {list(BACKENDS)}")
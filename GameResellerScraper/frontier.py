@@ -0,0 +1,165 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+from scrapy.http.request.json_request import json
+
+from GameResellerScraper.items import ItemRef
+
+QUEUED = "queued"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    slug TEXT PRIMARY KEY,
+    state TEXT,
+    last_fetched_at REAL,
+    updated_at REAL NOT NULL,
+    fingerprint TEXT,
+    base_item TEXT,
+    base_game INTEGER
+)
+"""
+# columns added since the table was first created, with their types
+ADDED_COLUMNS = {"fingerprint": "TEXT", "base_item": "TEXT", "base_game": "INTEGER"}
+
+
+class Frontier:
+    """Crawl state of every slug, persisted in SQLite so a killed crawl can resume.
+
+    All lookups go to an in-memory dict that mirrors the table, SQLite is only written
+    to. A slug whose state is NULL is known from an earlier crawl but not part of the
+    current one. The payload fingerprint of a slug outlives resets, so a new crawl can
+    tell which pages haven't changed since the last one. The base item a slug was
+    requested for is kept too, so a resumed request still maps the item to its base, and
+    whether it is a base game's page, for its scheduler priority.
+    """
+
+    states: dict[str, str]
+    last_fetched: dict[str, float]
+    fingerprints: dict[str, str]
+    base_items: dict[str, ItemRef]
+    base_games: dict[str, bool]
+
+    def __init__(self, path: str = ":memory:"):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        # WAL without a full fsync per commit keeps a commit per state change cheap, a
+        # crash loses at most the last few transitions
+        __ = self.db.execute("PRAGMA journal_mode=WAL")
+        __ = self.db.execute("PRAGMA synchronous=NORMAL")
+        __ = self.db.execute(SCHEMA)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(frontier)")}
+        for column, column_type in ADDED_COLUMNS.items():
+            if column not in columns:
+                # a frontier created before the column was added
+                __ = self.db.execute(f"ALTER TABLE frontier ADD COLUMN {column} {column_type}")
+        self.states = {}
+        self.last_fetched = {}
+        self.fingerprints = {}
+        self.base_items = {}
+        self.base_games = {}
+        for slug, state, last_fetched_at, fingerprint, base_item, base_game in self.db.execute(
+            "SELECT slug, state, last_fetched_at, fingerprint, base_item, base_game FROM frontier"
+        ):
+            if state is not None:
+                self.states[slug] = state
+            if last_fetched_at is not None:
+                self.last_fetched[slug] = last_fetched_at
+            if fingerprint is not None:
+                self.fingerprints[slug] = fingerprint
+            if base_item is not None:
+                self.base_items[slug] = ItemRef(**json.loads(base_item))
+            if base_game is not None:
+                self.base_games[slug] = bool(base_game)
+
+    def __contains__(self, slug: str):
+        return slug in self.states
+
+    def __len__(self):
+        return len(self.states)
+
+    def state(self, slug: str) -> Optional[str]:
+        return self.states.get(slug)
+
+    def fingerprint(self, slug: str) -> Optional[str]:
+        return self.fingerprints.get(slug)
+
+    def base_item(self, slug: str) -> Optional[ItemRef]:
+        return self.base_items.get(slug)
+
+    def base_game(self, slug: str) -> Optional[bool]:
+        return self.base_games.get(slug)
+
+    def mark(
+        self,
+        slug: str,
+        state: str,
+        fetched: bool = False,
+        base_item: Optional[ItemRef] = None,
+        base_game: Optional[bool] = None,
+    ):
+        now = time.time()
+        self.states[slug] = state
+        if fetched:
+            self.last_fetched[slug] = now
+        if base_item is not None:
+            self.base_items[slug] = base_item
+        if base_game is not None:
+            self.base_games[slug] = base_game
+        __ = self.db.execute(
+            "INSERT INTO frontier "
+            "(slug, state, last_fetched_at, updated_at, base_item, base_game) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (slug) DO UPDATE SET state = excluded.state, "
+            "last_fetched_at = COALESCE(excluded.last_fetched_at, last_fetched_at), "
+            "updated_at = excluded.updated_at, "
+            "base_item = COALESCE(excluded.base_item, base_item), "
+            "base_game = COALESCE(excluded.base_game, base_game)",
+            (
+                slug,
+                state,
+                now if fetched else None,
+                now,
+                base_item and json.dumps({k: getattr(base_item, k) for k in ItemRef.__slots__}),
+                base_game,
+            ),
+        )
+        self.db.commit()
+
+    def save_fingerprint(self, slug: str, fingerprint: str):
+        """Record the fingerprint of a page once its item has been stored"""
+        self.fingerprints[slug] = fingerprint
+        __ = self.db.execute(
+            "UPDATE frontier SET fingerprint = ?, updated_at = ? WHERE slug = ?",
+            (fingerprint, time.time(), slug),
+        )
+        self.db.commit()
+
+    def unfinished(self) -> list[str]:
+        """Slugs a resumed crawl still has to fetch"""
+        return [slug for slug, state in self.states.items() if state != DONE]
+
+    def reset(self):
+        """Start a new crawl over the known slugs, keeping their fetch times. Called when
+        a crawl finished, and by FRONTIER_RESUME = False."""
+        self.states = {}
+        __ = self.db.execute("UPDATE frontier SET state = NULL")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+def canonical_slug(slug: str) -> str:
+    """The store page slug of a mapping pageSlug or a product URL: last path segment,
+    lower-cased, without query string, fragment or trailing slash"""
+    slug = slug.strip()
+    if "/" in slug or "?" in slug or "#" in slug:
+        slug = urlsplit(slug).path.rstrip("/").rsplit("/", 1)[-1]
+    return slug.lower()
@@ -3,6 +3,9 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
 
+from dataclasses import dataclass
+from typing import Any, Optional
+
 import scrapy
 
 
@@ -34,3 +37,52 @@ class GameItem(scrapy.Item):
     base_item = scrapy.Field()
     mappings = scrapy.Field()
     url = scrapy.Field()
+
+
+class SeenItem(scrapy.Item):
+    """A page whose payload fingerprint matches the previous crawl's: its identity and
+    the mappings to follow, instead of a full GameItem. The pipelines pass it on
+    without writing anything."""
+
+    title = scrapy.Field()
+    ref_id = scrapy.Field()
+    ref_namespace = scrapy.Field()
+    ref_slug = scrapy.Field()
+    base_item = scrapy.Field()
+    mappings = scrapy.Field()
+    fingerprint = scrapy.Field()
+    url = scrapy.Field()
+
+
+class PriceItem(scrapy.Item):
+    """Current price of a known item, what the game-price spider yields instead of a
+    GameItem"""
+
+    ref_namespace = scrapy.Field()
+    ref_id = scrapy.Field()
+    ref_slug = scrapy.Field()
+    origin_price = scrapy.Field()
+    discount_price = scrapy.Field()
+    discount = scrapy.Field()
+    observed_at = scrapy.Field()
+    url = scrapy.Field()
+
+
+@dataclass
+class ItemRef:
+    """Identity of a parent item, what a child's base_item needs to be mapped to it.
+
+    Requests for DLCs and add-ons carry this instead of the whole parent GameItem, so
+    the queued requests don't keep the parent's images, reviews and descriptions alive.
+    A dataclass so item exporters and ItemAdapter serialize it like an item.
+    """
+
+    __slots__ = ("title", "ref_id", "ref_namespace")
+
+    title: Optional[str]
+    ref_id: Optional[str]
+    ref_namespace: Optional[str]
+
+    @classmethod
+    def of(cls, item: Any) -> "ItemRef":
+        return cls(item.get("title"), item.get("ref_id"), item.get("ref_namespace"))
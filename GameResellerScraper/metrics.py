@@ -0,0 +1,203 @@
+"""Stage timers and counters kept in the crawler stats, and a Prometheus endpoint.
+
+A timed stage adds three stats: `timing/<stage>/count`, `timing/<stage>/seconds` (the
+sum) and `timing/<stage>/max`. They end up in the stats dump at the end of the crawl
+and, with METRICS_ENABLED, are served as Prometheus text on METRICS_HOST:METRICS_PORT
+while the crawl runs.
+"""
+
+import functools
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from scrapy import Request, Spider, signals
+from scrapy.crawler import Crawler
+from scrapy.http import Response
+from scrapy.statscollectors import StatsCollector
+from scrapy.utils.reactor import listen_tcp
+from twisted.web.resource import Resource
+from twisted.web.server import Request as WebRequest, Site
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+TIMING_PREFIX = "timing/"
+NOT_FOUND_PREFIX = "parser/not_found/"
+
+_METRIC_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def observe(stats: Optional[StatsCollector], stage: str, seconds: float):
+    if stats is None:
+        return
+    stats.inc_value(f"{TIMING_PREFIX}{stage}/count")
+    stats.inc_value(f"{TIMING_PREFIX}{stage}/seconds", seconds, start=0.0)
+    stats.max_value(f"{TIMING_PREFIX}{stage}/max", seconds)
+
+
+@contextmanager
+def timer(stats: Optional[StatsCollector], stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stats, stage, time.perf_counter() - start)
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """Time a method into the stats of its instance's `stats` attribute"""
+
+    def decorator(method: F) -> F:
+        @functools.wraps(method)
+        def wrapper(self: Any, *args: Any, **kwargs: Any):
+            stats = self.stats
+            if stats is None:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                observe(stats, stage, time.perf_counter() - start)
+
+        return wrapper  # pyright: ignore[reportReturnType]
+
+    return decorator
+
+
+class Timings:
+    """Stage durations measured on a thread pool, recorded into the stats once the
+    work is back on the reactor thread"""
+
+    __slots__ = ("seconds",)
+
+    seconds: dict[str, float]
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start
+
+    def record(self, stats: Optional[StatsCollector], prefix: str):
+        for stage, seconds in self.seconds.items():
+            observe(stats, f"{prefix}/{stage}", seconds)
+
+
+class Metrics:
+    """Times downloads, split by handler, and serves the stats in the Prometheus text
+    format when METRICS_ENABLED is set"""
+
+    started: dict[Request, float]
+
+    def __init__(self, crawler: Crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.started = {}
+        self.enabled = crawler.settings.getbool("METRICS_ENABLED")
+        self.portrange = [int(x) for x in crawler.settings.getlist("METRICS_PORT")]
+        self.host = crawler.settings.get("METRICS_HOST", "127.0.0.1")
+        self.port = None
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        extension = cls(crawler)
+        crawler.signals.connect(
+            extension.request_reached_downloader, signal=signals.request_reached_downloader
+        )
+        crawler.signals.connect(extension.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(
+            extension.request_left_downloader, signal=signals.request_left_downloader
+        )
+        crawler.signals.connect(extension.engine_started, signal=signals.engine_started)
+        crawler.signals.connect(extension.engine_stopped, signal=signals.engine_stopped)
+        return extension
+
+    def request_reached_downloader(self, request: Request, spider: Spider):
+        self.started[request] = time.perf_counter()
+
+    def response_downloaded(self, response: Response, request: Request, spider: Spider):
+        start = self.started.pop(request, None)
+        if start is None:
+            return
+        handler = "playwright" if request.meta.get("playwright") else "http"
+        observe(self.stats, f"download/{handler}", time.perf_counter() - start)
+
+    def request_left_downloader(self, request: Request, spider: Spider):
+        # failed downloads never reach response_downloaded
+        __ = self.started.pop(request, None)
+
+    def engine_started(self):
+        if not self.enabled:
+            return
+        self.port = listen_tcp(self.portrange, self.host, Site(MetricsResource(self.stats)))
+        address = self.port.getHost()
+        self.crawler.spider.logger.info(
+            f"metrics -> serving on http://{address.host}:{address.port}/metrics"
+        )
+
+    def engine_stopped(self):
+        if self.port is not None:
+            __ = self.port.stopListening()
+            self.port = None
+
+
+class MetricsResource(Resource):
+    isLeaf = True
+
+    def __init__(self, stats: Optional[StatsCollector]):
+        super().__init__()
+        self.stats = stats
+
+    def render_GET(self, request: WebRequest) -> bytes:
+        request.setHeader(b"Content-Type", b"text/plain; version=0.0.4; charset=utf-8")
+        return prometheus_text(self.stats.get_stats() if self.stats else {}).encode()
+
+
+def prometheus_text(stats: dict[str, Any], namespace: str = "scrapy") -> str:
+    """Stats in the Prometheus text exposition format. Stage timings become a summary
+    labelled by stage, not-found counters a counter labelled by queryKey and every
+    other number a gauge named after its stat."""
+    families: dict[str, tuple[str, list[str]]] = {}
+
+    def sample(family: str, kind: str, value: Any, name: str = "", **labels: str):
+        samples = families.setdefault(family, (kind, []))[1]
+        label_text = ",".join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+        label_text = f"{{{label_text}}}" if label_text else ""
+        samples.append(f"{name or family}{label_text} {float(value)!r}")
+
+    for key, value in sorted(stats.items()):
+        if isinstance(value, datetime):
+            value = value.timestamp()
+        if not isinstance(value, (int, float)):
+            continue
+        if key.startswith(TIMING_PREFIX):
+            stage, _, field = key[len(TIMING_PREFIX) :].rpartition("/")
+            family = f"{namespace}_stage_seconds"
+            if field == "count":
+                sample(family, "summary", value, f"{family}_count", stage=stage)
+            elif field == "seconds":
+                sample(family, "summary", value, f"{family}_sum", stage=stage)
+            elif field == "max":
+                sample(f"{family}_max", "gauge", value, stage=stage)
+        elif key.startswith(NOT_FOUND_PREFIX):
+            family = f"{namespace}_parser_not_found_total"
+            sample(family, "counter", value, query_key=key[len(NOT_FOUND_PREFIX) :])
+        else:
+            sample(f"{namespace}_{_METRIC_NAME.sub('_', key)}", "gauge", value)
+
+    lines: list[str] = []
+    for family, (kind, samples) in families.items():
+        lines.append(f"# TYPE {family} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
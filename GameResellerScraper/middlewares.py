@@ -3,12 +3,23 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import Request, signals
+import asyncio
+import random
+import time
+from typing import Any
+
+from scrapy import Request, Spider, signals
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
-from scrapy.http import Response
-
+from scrapy.crawler import Crawler
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Headers, Response
+from scrapy.responsetypes import responsetypes
+from scrapy.statscollectors import StatsCollector
+from w3lib.url import canonicalize_url
+
+from GameResellerScraper.archive import ResponseArchive
 from GameResellerScraper.settings import IS_MOCK
 
 
@@ -104,3 +115,95 @@ class GameResellerScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class HttpArchiveMiddleware:
+    """Records responses to a ResponseArchive, or serves them back from it.
+
+    With HTTP_ARCHIVE_MODE = "record" every downloaded response is stored with its
+    status and headers. With "replay" requests are answered from the archive after
+    HTTP_ARCHIVE_LATENCY +/- HTTP_ARCHIVE_LATENCY_JITTER seconds, and requests that were
+    never recorded are dropped, so the spider, parser and pipelines run end to end with
+    no network. Installed next to the download handler, the archive holds bodies as they
+    came off the wire and decompression still runs on replay.
+    """
+
+    def __init__(
+        self,
+        archive: ResponseArchive,
+        mode: str,
+        stats: StatsCollector,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+    ):
+        self.archive = archive
+        self.mode = mode
+        self.stats = stats
+        self.latency = latency
+        self.jitter = jitter
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        mode = crawler.settings.get("HTTP_ARCHIVE_MODE")
+        if not mode:
+            raise NotConfigured
+        if mode not in ("record", "replay"):
+            raise NotConfigured(f"unknown HTTP_ARCHIVE_MODE {mode!r}")
+        archive = ResponseArchive(
+            crawler.settings.get("HTTP_ARCHIVE_PATH", "./GameResellerScraper/data/http-archive"),
+            writable=mode == "record",
+        )
+        s = cls(
+            archive,
+            mode,
+            crawler.stats,
+            latency=crawler.settings.getfloat("HTTP_ARCHIVE_LATENCY"),
+            jitter=crawler.settings.getfloat("HTTP_ARCHIVE_LATENCY_JITTER"),
+        )
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    async def process_request(self, request: Request, spider: Spider):
+        if self.mode != "replay":
+            return None
+        recorded = self.archive.get(archive_key(request))
+        if recorded is None:
+            self.stats.inc_value("http_archive/missing")
+            raise IgnoreRequest(f"{request.url} is not in the archive")
+        header, body = recorded
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        self.stats.inc_value("http_archive/replayed")
+        headers = Headers(header["headers"])
+        respcls = responsetypes.from_args(headers=headers, url=header["url"], body=body)
+        return respcls(
+            url=header["url"],
+            status=header["status"],
+            headers=headers,
+            body=body,
+            request=request,
+            flags=["archived"],
+        )
+
+    def process_response(self, request: Request, response: Response, spider: Spider):
+        if self.mode == "record" and "archived" not in response.flags:
+            header: dict[str, Any] = {
+                "url": response.url,
+                "status": response.status,
+                "headers": {
+                    key.decode("latin-1"): [value.decode("latin-1") for value in values]
+                    for key, values in response.headers.items()
+                },
+                "recorded_at": time.time(),
+            }
+            self.archive.put(archive_key(request), header, response.body)
+            self.stats.inc_value("http_archive/recorded")
+        return response
+
+    def spider_closed(self, spider: Spider):
+        self.archive.close()
+
+
+def archive_key(request: Request) -> str:
+    return f"{request.method} {canonicalize_url(request.url)}"
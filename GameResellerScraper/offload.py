@@ -0,0 +1,147 @@
+"""Parsing on a process pool, off the reactor thread.
+
+With PARSE_WORKERS > 0 the spider hands the page bytes from the
+__REACT_QUERY_INITIAL_QUERIES__ marker onwards to `parse_payload` in a worker process.
+The worker scans and decodes the payload, runs the extractors and sends back the item
+fields as a plain dict. Only the GameItem itself, with its base_item, is built on the
+reactor thread. With PARSE_WORKERS = 0, or in IS_MOCK mode, pages are parsed in-process
+as before, and only archiving the payload, hashing and compressing it, goes to a thread.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+from scrapy.http import Response
+from scrapy.statscollectors import StatsCollector
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.threads import deferToThread
+
+from GameResellerScraper.decoders import get_decoder
+from GameResellerScraper.items import GameItem
+from GameResellerScraper.metrics import TIMING_PREFIX, timer
+from GameResellerScraper.parser import (
+    REACT_QUERY_MARKER,
+    REACT_QUERY_MARKER_BYTES,
+    ItemParser1,
+    QueriesNotFound,
+    QueryIndex,
+)
+from GameResellerScraper.payloads import PayloadArchive
+from GameResellerScraper.settings import IS_MOCK
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStats:
+    """The part of the StatsCollector interface the parser uses, kept in a dict so a
+    worker can send its counters and timings back with the result"""
+
+    __slots__ = ("values",)
+
+    values: dict[str, Any]
+
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key: str, count: Any = 1, start: Any = 0):
+        self.values[key] = self.values.get(key, start) + count
+
+    def max_value(self, key: str, value: Any):
+        self.values[key] = max(self.values.get(key, value), value)
+
+
+# what ItemParser1 learns about a page besides its fields, sent back from a worker
+PARSER_RESULTS = ("payload_digest", "fingerprint", "unchanged")
+
+
+def parse_payload(
+    body: bytes,
+    url: str,
+    backend: str = "stdlib",
+    archive: Optional[tuple[str, str]] = None,
+    fingerprint_pages: bool = False,
+    known_fingerprint: Optional[str] = None,
+) -> tuple[Optional[dict[str, Any]], dict[str, Any], dict[str, Any]]:
+    """Item fields of a page, the stats the parser collected and its PARSER_RESULTS.
+    Runs in a worker, `archive` is the (path, compression) of the spider's
+    PayloadArchive."""
+    stats: Any = LocalStats()
+    parser = ItemParser1(
+        logger,
+        decode_queries=get_decoder(backend),
+        stats=stats,
+        archive=PayloadArchive(*archive) if archive else None,
+        fingerprint_pages=fingerprint_pages,
+        known_fingerprint=known_fingerprint,
+    )
+    with timer(stats, "parse/worker"):
+        queries = parser.queries_from_body(body, url)
+        fields = parser.extract_fields(QueryIndex(queries), url) if queries else None
+        if fields:
+            with timer(stats, "parse/archive"):
+                parser.store_payload()
+    return fields, stats.values, {name: getattr(parser, name) for name in PARSER_RESULTS}
+
+
+class ParsePool:
+    executor: Optional[ProcessPoolExecutor]
+
+    def __init__(self, workers: int = 0, backend: str = "stdlib"):
+        self.backend = backend
+        self.executor = None
+        if workers > 0 and not IS_MOCK:
+            # spawned rather than forked: the parent runs the reactor, the adbapi pool
+            # threads and playwright, none of which survive a fork
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    async def parse(self, parser: ItemParser1, response: Response) -> Optional[GameItem]:
+        if self.executor is None:
+            item = parser.parse(response)
+            if item and parser.archive is not None:
+                with timer(parser.stats, "parse/archive"):
+                    await maybe_deferred_to_future(deferToThread(parser.store_payload))
+            return item
+
+        url: str = response.url.split("/")[-1]
+        if not parser.accepts(url):
+            return None
+        body = response.body
+        marker = body.find(REACT_QUERY_MARKER_BYTES)
+        if marker == -1:
+            raise QueriesNotFound(f"{url}: no {REACT_QUERY_MARKER} script")
+        # everything before the marker is HTML head the worker doesn't need
+        archive = parser.archive and (str(parser.archive.path), parser.archive.compression)
+        future = self.executor.submit(
+            parse_payload,
+            body[marker:],
+            url,
+            self.backend,
+            archive,
+            parser.fingerprint_pages,
+            parser.known_fingerprint,
+        )
+        with timer(parser.stats, "parse/offload"):
+            fields, values, results = await asyncio.wrap_future(future)
+        merge_stats(parser.stats, values)
+        for name, value in results.items():
+            setattr(parser, name, value)
+        return parser.make_item(fields, response) if fields else None
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def merge_stats(stats: Optional[StatsCollector], values: dict[str, Any]):
+    if stats is None:
+        return
+    for key, value in values.items():
+        if key.startswith(TIMING_PREFIX) and key.endswith("/max"):
+            stats.max_value(key, value)
+        else:
+            stats.inc_value(key, value, start=type(value)())
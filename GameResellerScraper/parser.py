@@ -1,30 +1,170 @@
+import hashlib
+import re
+from datetime import datetime, timezone
 from pathlib import Path
 from random import randrange
-from typing import Any, Optional, cast
+from typing import Any, Optional, Union, cast
 from scrapy import Spider
-from scrapy.http.request.json_request import json
 from scrapy.utils.response import os
 from typing_extensions import override
 from scrapy.http import Response
-from GameResellerScraper.items import GameItem
+from scrapy.statscollectors import StatsCollector
+from scrapy.http.request.json_request import json
+from GameResellerScraper.accessors import compile_path
+from GameResellerScraper.decoders import Payload, QueriesDecoder, decode_stdlib
+from GameResellerScraper.frontier import Frontier, canonical_slug
+from GameResellerScraper.items import GameItem, PriceItem, SeenItem
+from GameResellerScraper.metrics import timed, timer
+from GameResellerScraper.payloads import PayloadArchive
 from GameResellerScraper.settings import IS_MOCK
 from scrapy.utils.log import SpiderLoggerAdapter
 
+REACT_QUERY_MARKER = "__REACT_QUERY_INITIAL_QUERIES__"
+REACT_QUERY_MARKER_BYTES = REACT_QUERY_MARKER.encode()
+
+_ASSIGNMENT = re.compile(rb"\s*=\s*")
+_STATEMENT_TRAILER = b"; \t\r\n"
+_JSON_BRACKET_OR_QUOTE = re.compile(rb'[{}\[\]"]')
+_JSON_QUOTE_OR_ESCAPE = re.compile(rb'["\\]')
+
+# Paths read by the extractors, compiled once at import
+CATALOG_OFFER = compile_path("state.data.Catalog.catalogOffer")
+OFFER_MAPPINGS = compile_path("catalogNs.mappings")
+OFFER_DISCOUNT_PRICE = compile_path("price.totalPrice.discountPrice")
+OFFER_ORIGIN_PRICE = compile_path("price.totalPrice.originalPrice")
+OFFER_DISCOUNT = compile_path("price.totalPrice.discount")
+SANDBOX_CONFIGURATION = compile_path("state.data.Product.sandbox.configuration")
+HOME_CONFIG = compile_path("state.data.Product.sandbox.configuration[1].configs")
+STORE_GAME_CONFIG = compile_path(
+    "state.data.Product.sandbox.configuration['configs.productDisplayName=$title'].configs"
+)
+EGS_BRANDING = compile_path("state.data.branding")
+EGS_CRITIC_REVIEWS = compile_path("state.data.criticReviews")
+PRODUCT_RESULT = compile_path("state.data.RatingsPolls.getProductResult")
+MAPPING_PAGE_SLUG = compile_path("state.data.StorePageMapping.mapping.pageSlug")
+
+# The queries the extractors read, what a page's fingerprint covers. Keys that change
+# without the page changing are left out.
+FINGERPRINT_QUERIES = frozenset(
+    {
+        "getCatalogOffer",
+        "getProductHomeConfig",
+        "getStoreConfig",
+        "egs-platform",
+        "getProductResult",
+        "getMappingByPageSlug",
+    }
+)
+VOLATILE_KEYS = (
+    "dataUpdatedAt",
+    "dataUpdateCount",
+    "errorUpdatedAt",
+    "updatedDate",
+    "lastModifiedDate",
+)
+# The queries the SeenItem of an unchanged page is read from
+SEEN_QUERIES = frozenset({"getCatalogOffer", "getMappingByPageSlug"})
+
+_QUERIES_START = re.compile(rb'"queries"\s*:\s*\[')
+# React Query dehydrates an entry as {state, queryKey, queryHash}: it ends with the `}`
+# after its queryHash, a JSON string of the queryKey whose first element is the name
+QUERY_HASH_BYTES = b'"queryHash"'
+_QUERY_HASH_HEAD = re.compile(rb'"queryHash"\s*:\s*"(?:\[\\"([^"\\]*))?')
+_STRING_END_AND_BRACE = re.compile(rb'"\s*}')
+_VOLATILE = re.compile(
+    rb'"(?:' + "|".join(VOLATILE_KEYS).encode() + rb')"\s*:\s*(?:"[^"]*"|[-\w.]+)'
+)
+
+
+class QueriesNotFound(Exception):
+    """The response has no usable __REACT_QUERY_INITIAL_QUERIES__ script, either because
+    it is missing from the server-rendered HTML or because it failed to decode."""
+
+
+class QueryIndex:
+    """queryKey -> entries multimap of a React Query payload, built once per page so the
+    extractors don't rescan the whole queries list for every lookup."""
+
+    entries: dict[str, list[dict[Any, Any]]]
+
+    def __init__(self, queries: list[dict[Any, Any]]):
+        self.entries = {}
+        for query in queries:
+            self.entries.setdefault(query_key(query), []).append(query)
+
+    def first(self, key: str) -> Optional[dict[Any, Any]]:
+        """First entry for `key`, or None when the page has no such query"""
+        entries = self.entries.get(key)
+        return entries[0] if entries else None
+
+    def all(self, key: str) -> list[dict[Any, Any]]:
+        return self.entries.get(key) or []
+
+    def __contains__(self, key: str):
+        return key in self.entries
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
 
 class ItemParser:
     logger: SpiderLoggerAdapter
-    scrapped_slugs = []
-
-    def __init__(self, logger: Any, scrapped_slugs: list[str]):
+    frontier: Optional[Frontier]
+    decode_queries: QueriesDecoder
+    stats: Optional[StatsCollector]
+    archive: Optional[PayloadArchive]
+    fingerprint_pages: bool
+    known_fingerprint: Optional[str]
+    payload: Optional[memoryview]
+    payload_digest: Optional[str]
+    fingerprint: Optional[str]
+    unchanged: bool
+
+    def __init__(
+        self,
+        logger: Any,
+        frontier: Optional[Frontier] = None,
+        decode_queries: QueriesDecoder = decode_stdlib,
+        stats: Optional[StatsCollector] = None,
+        archive: Optional[PayloadArchive] = None,
+        fingerprint_pages: bool = False,
+        known_fingerprint: Optional[str] = None,
+    ):
         self.logger = logger
-        self.scrapped_slugs = scrapped_slugs
+        self.frontier = frontier
+        self.decode_queries = decode_queries
+        self.stats = stats
+        self.archive = archive
+        # with SKIP_UNCHANGED_PAGES: fingerprint every page, and read only the SeenItem
+        # of a page whose fingerprint is known_fingerprint
+        self.fingerprint_pages = fingerprint_pages
+        self.known_fingerprint = known_fingerprint
+        # set while parsing a page: its decoded payload and the digest it was archived
+        # under, its fingerprint and whether that matches known_fingerprint
+        self.payload = None
+        self.payload_digest = None
+        self.fingerprint = None
+        self.unchanged = False
 
     def parse(self, response: Response, **kwargs: Any) -> Optional[GameItem]:
         pass
 
+    def store_payload(self):
+        """Archive the payload of the parsed page. Blocking: the spider runs it on a
+        thread, parse workers inline."""
+        if self.archive is not None and self.payload is not None:
+            self.payload_digest = self.archive.store(bytes(self.payload))
+
+    def not_found(self, url: str, key: str):
+        """Count a query (or a part of one) missing from the page, per queryKey"""
+        if self.stats is not None:
+            self.stats.inc_value(f"parser/not_found/{key}")
+        self.logger.debug(f"parse {url} -> not found {key}")
+
 
 class ItemParser1(ItemParser):
     @override
+    @timed("parse/page")
     def parse(self, response: Response, **kwargs: Any) -> Optional[GameItem]:
         url: str = response.url.split("/")[-1]
         queries = (
@@ -32,15 +172,30 @@ class ItemParser1(ItemParser):
         )
         if not queries:
             return None
-        catalog_offer = self.extract_catalog_offer(queries=queries, url=url)
-        product_home_config = self.extract_product_home_config(queries=queries, url=url)
+        return self.make_item(self.extract_fields(QueryIndex(queries), url), response)
+
+    def make_item(self, fields: dict[str, Any], response: Response) -> Union[GameItem, SeenItem]:
+        item_class = SeenItem if self.unchanged else GameItem
+        return item_class(
+            **fields,
+            base_item=response.request and response.request.cb_kwargs.get("item") or None,
+        )
+
+    def extract_fields(self, index: QueryIndex, url: str) -> dict[str, Any]:
+        """Every GameItem field but base_item, as a plain dict that can be pickled back
+        from a parse worker. An unchanged page only gets the SeenItem fields."""
+        if self.unchanged:
+            return self.extract_seen_fields(index, url)
+
+        catalog_offer = self.extract_catalog_offer(queries=index, url=url)
+        product_home_config = self.extract_product_home_config(queries=index, url=url)
         store_config = self.extract_store_config(
-            queries=queries, url=url, current_game_title=catalog_offer["title"]
+            queries=index, url=url, current_game_title=catalog_offer.get("title")
         )
-        egs_platform = self.extract_egs_platform(queries=queries, url=url)
-        product_result = self.extract_product_result(queries=queries, url=url)
-        mapping_by_page_slug = self.extract_mapping_by_page_slug(queries=queries, url=url)
-        item = GameItem(
+        egs_platform = self.extract_egs_platform(queries=index, url=url)
+        product_result = self.extract_product_result(queries=index, url=url)
+        mapping_by_page_slug = self.extract_mapping_by_page_slug(queries=index, url=url)
+        return dict(
             title=catalog_offer.get("title"),
             ref_id=catalog_offer.get("ref_id"),
             ref_namespace=catalog_offer.get("ref_namespace"),
@@ -68,21 +223,33 @@ class ItemParser1(ItemParser):
             critic_reviews=egs_platform.get("critic_reviews"),
             polls=product_result.get("polls"),
             avg_rating=product_result.get("avg_rating"),
-            base_item=response.request and response.request.cb_kwargs.get("item") or None,
-            mappings=catalog_offer["mappings"],
+            mappings=catalog_offer.get("mappings"),
             url=url,
         )
 
-        return item
+    def extract_seen_fields(self, index: QueryIndex, url: str) -> dict[str, Any]:
+        catalog_offer = self.extract_catalog_offer(queries=index, url=url)
+        mapping_by_page_slug = self.extract_mapping_by_page_slug(queries=index, url=url)
+        return dict(
+            title=catalog_offer.get("title"),
+            ref_id=catalog_offer.get("ref_id"),
+            ref_namespace=catalog_offer.get("ref_namespace"),
+            ref_slug=mapping_by_page_slug.get("ref_slug"),
+            mappings=catalog_offer.get("mappings"),
+            fingerprint=self.fingerprint,
+            url=url,
+        )
 
-    def extract_catalog_offer(self, queries: dict[Any, Any], url: str):
+    @timed("parse/extract_catalog_offer")
+    def extract_catalog_offer(self, queries: QueryIndex, url: str):
         self.logger.info(f"parse {url} -> extract getCatalogOffer")
-        catalog_offer_query = next(x for x in queries if x["queryKey"][0] == "getCatalogOffer")
+        catalog_offer_query = queries.first("getCatalogOffer")
         if not catalog_offer_query:
-            self.logger.warning(f"parse {url} -> not found getCatalogOffer")
+            self.not_found(url, "getCatalogOffer")
             return cast(dict[Any, Any], {})
         catalog_offer = cast(
-            dict[Any, Any], get_nested(catalog_offer_query, "state.data.Catalog.catalogOffer")
+            dict[Any, Any],
+            CATALOG_OFFER.get(catalog_offer_query) or {},
         )
 
         item: dict[Any, Any] = {
@@ -103,67 +270,60 @@ class ItemParser1(ItemParser):
                     catalog_offer.get("tags") or [],
                 )
             ),
-            "images": get_nested(catalog_offer, "keyImages") or [],
-            "mappings": get_nested(catalog_offer, "catalogNs.mappings"),
+            "images": catalog_offer.get("keyImages") or [],
+            "mappings": OFFER_MAPPINGS.get(catalog_offer),
             "price": {
-                "discount_price": get_nested(catalog_offer, "price.totalPrice.discountPrice"),
-                "origin_price": get_nested(catalog_offer, "price.totalPrice.originalPrice"),
-                "discount": get_nested(catalog_offer, "price.totalPrice.discount"),
+                "discount_price": OFFER_DISCOUNT_PRICE.get(catalog_offer),
+                "origin_price": OFFER_ORIGIN_PRICE.get(catalog_offer),
+                "discount": OFFER_DISCOUNT.get(catalog_offer),
             },
-            "long_description": get_nested(catalog_offer, "longDescription"),
-            "release_date": get_nested(catalog_offer, "releaseDate"),
+            "long_description": catalog_offer.get("longDescription"),
+            "release_date": catalog_offer.get("releaseDate"),
         }
 
         return item
 
-    def extract_product_home_config(self, queries: dict[Any, Any], url: str):
+    @timed("parse/extract_product_home_config")
+    def extract_product_home_config(self, queries: QueryIndex, url: str):
         self.logger.info(f"parse {url} -> extract getProductHomeConfig")
-        query = next((x for x in queries if x["queryKey"][0] == "getProductHomeConfig"), None)
-        sandbox_config = cast(
-            list[Any], get_nested(query, "state.data.Product.sandbox.configuration")
-        )
-        if not sandbox_config:
-            self.logger.warning(f"parse {url} -> not found getProductHomeConfig")
+        query = queries.first("getProductHomeConfig")
+        if not SANDBOX_CONFIGURATION.get(query):
+            self.not_found(url, "getProductHomeConfig")
             return {}
+        home_config: dict[Any, Any] = HOME_CONFIG.get(query) or {}
 
         item = {
-            "long_description": get_nested(sandbox_config[1], "configs.longDescription"),
-            "images": get_nested(sandbox_config[1], "configs.keyImages"),
+            "long_description": home_config.get("longDescription"),
+            "images": home_config.get("keyImages"),
         }
 
         return item
 
-    def extract_store_config(self, queries: dict[Any, Any], url: str, current_game_title: str):
+    @timed("parse/extract_store_config")
+    def extract_store_config(
+        self, queries: QueryIndex, url: str, current_game_title: Optional[str]
+    ):
         self.logger.info(f"parse {url} -> extract getStoreConfig")
-        query = next(x for x in queries if x["queryKey"][0] == "getStoreConfig")
-        sandbox_config: list[Any] = (
-            get_nested(query, "state.data.Product.sandbox.configuration") or []
-        )
-        if not sandbox_config:
-            self.logger.warning(f"parse {url} -> not found getStoreConfig")
+        query = queries.first("getStoreConfig")
+        if not SANDBOX_CONFIGURATION.get(query):
+            self.not_found(url, "getStoreConfig")
             return {}
-        current_game_config = next(
-            (
-                x
-                for x in sandbox_config
-                if get_nested(x, "configs.productDisplayName") == current_game_title
-            ),
-            None,
+        current_game_config: dict[Any, Any] = (
+            STORE_GAME_CONFIG.get(query, title=current_game_title) or {}
         )
 
         item = {
-            "supported_audio": get_nested(current_game_config, "configs.supportedAudio"),
-            "supported_text": get_nested(current_game_config, "configs.supportedText"),
-            "technical_requirements": get_nested(
-                current_game_config, "configs.technicalRequirements"
-            ),
-            "theme": get_nested(current_game_config, "configs.theme"),
+            "supported_audio": current_game_config.get("supportedAudio"),
+            "supported_text": current_game_config.get("supportedText"),
+            "technical_requirements": current_game_config.get("technicalRequirements"),
+            "theme": current_game_config.get("theme"),
         }
-        item["images"] = get_nested(current_game_config, "configs.keyImages") or []
+        item["images"] = current_game_config.get("keyImages") or []
 
         return item
 
-    def extract_egs_platform(self, queries: dict[Any, Any], url: str):
+    @timed("parse/extract_egs_platform")
+    def extract_egs_platform(self, queries: QueryIndex, url: str):
         self.logger.info(f"parse {url} -> extract egs-platform(s)")
         item: dict[Any, Any] = {
             "branding": None,
@@ -172,102 +332,144 @@ class ItemParser1(ItemParser):
             "critic_recommend_pct": None,
             "critic_reviews": None,
         }
-        for query in queries:
-            if query["queryKey"][0] == "egs-platform":
-                self.logger.info(f"parse {url} -> found egs-platform")
-                item["branding"] = get_nested(query, "state.data.branding") or item["branding"]
-
-                criticReviews = get_nested(query, "state.data.criticReviews")
-                if type(criticReviews) is not dict:
-                    continue
-                item["critic_avg"] = criticReviews.get("criticAverage") or item["critic_avg"]
-                item["critic_rating"] = criticReviews.get("criticRating") or item["critic_rating"]
-                item["critic_recommend_pct"] = (
-                    criticReviews.get("recommendPercentage") or item["critic_recommend_pct"]
+        for query in queries.all("egs-platform"):
+            self.logger.info(f"parse {url} -> found egs-platform")
+            item["branding"] = EGS_BRANDING.get(query) or item["branding"]
+
+            criticReviews = EGS_CRITIC_REVIEWS.get(query)
+            if type(criticReviews) is not dict:
+                continue
+            item["critic_avg"] = criticReviews.get("criticAverage") or item["critic_avg"]
+            item["critic_rating"] = criticReviews.get("criticRating") or item["critic_rating"]
+            item["critic_recommend_pct"] = (
+                criticReviews.get("recommendPercentage") or item["critic_recommend_pct"]
+            )
+            reviews = criticReviews.get("reviews")
+            if not reviews or type(reviews) is not dict:
+                continue
+            if not item["critic_reviews"]:
+                item["critic_reviews"] = []
+            for review in reviews.get("data") or []:
+                _ = item["critic_reviews"].append(
+                    {
+                        "author": review.get("author"),
+                        "body": review.get("body"),
+                        "outlet": review.get("outlet"),
+                        "score": {
+                            "type": review.get("score").get("__typename"),
+                            "earned_score": review.get("score").get("earnedScore"),
+                            "total_score": review.get("score").get("totalScore"),
+                        },
+                        "url": review.get("url"),
+                    }
                 )
-                reviews = criticReviews.get("reviews")
-                if not reviews or type(reviews) is not dict:
-                    continue
-                if not item["critic_reviews"]:
-                    item["critic_reviews"] = []
-                for review in reviews.get("data") or []:
-                    _ = item["critic_reviews"].append(
-                        {
-                            "author": review.get("author"),
-                            "body": review.get("body"),
-                            "outlet": review.get("outlet"),
-                            "score": {
-                                "type": review.get("score").get("__typename"),
-                                "earned_score": review.get("score").get("earnedScore"),
-                                "total_score": review.get("score").get("totalScore"),
-                            },
-                            "url": review.get("url"),
-                        }
-                    )
 
         return item
 
-    def extract_product_result(self, queries: dict[Any, Any], url: str):
+    @timed("parse/extract_product_result")
+    def extract_product_result(self, queries: QueryIndex, url: str):
         self.logger.info(f"parse {url} -> extract getProductResult")
-        query = next((x for x in queries if x["queryKey"][0] == "getProductResult"), None)
+        query = queries.first("getProductResult")
         if not query:
-            self.logger.warning(f"parse {url} -> not found getProductResult")
+            self.not_found(url, "getProductResult")
             return {}
 
-        product_result = get_nested(query, "state.data.RatingsPolls.getProductResult") or {}
-        poll_result: list[Any] = get_nested(product_result, "pollResult") or []
+        product_result = PRODUCT_RESULT.get(query) or {}
+        poll_result: list[Any] = product_result.get("pollResult") or []
         if not poll_result:
-            self.logger.warning(f"parse {url} -> not found pollResult")
+            self.not_found(url, "getProductResult.pollResult")
             return {}
 
-        polls: Any = map(
-            lambda x: {
-                "ref_id": x.get("id"),
-                "ref_tag_id": x.get("tagId"),
-                "ref_poll_definition_id": x.get("pollDefinitionId"),
-                "text": get_nested(x, "localizations.text"),
-                "emoji": get_nested(x, "localizations.emoji"),
-                "result_emoji": get_nested(x, "localizations.resultEmoji"),
-                "result_title": get_nested(x, "localizations.resultTitle"),
-                "result_text": get_nested(x, "localizations.resultText"),
-                "total": x.get("total"),
-            },
-            poll_result,
-        )
-
-        return {"polls": list(polls), "avg_rating": product_result.get("averageRating")}
-
-    def extract_mapping_by_page_slug(self, queries: dict[Any, Any], url: str):
+        polls: list[Any] = []
+        for x in poll_result:
+            localizations = x.get("localizations") or {}
+            polls.append(
+                {
+                    "ref_id": x.get("id"),
+                    "ref_tag_id": x.get("tagId"),
+                    "ref_poll_definition_id": x.get("pollDefinitionId"),
+                    "text": localizations.get("text"),
+                    "emoji": localizations.get("emoji"),
+                    "result_emoji": localizations.get("resultEmoji"),
+                    "result_title": localizations.get("resultTitle"),
+                    "result_text": localizations.get("resultText"),
+                    "total": x.get("total"),
+                }
+            )
+
+        return {"polls": polls, "avg_rating": product_result.get("averageRating")}
+
+    @timed("parse/extract_mapping_by_page_slug")
+    def extract_mapping_by_page_slug(self, queries: QueryIndex, url: str):
         self.logger.info(f"parse {url} -> extract getMappingByPageSlug")
-        query = next(x for x in queries if x["queryKey"][0] == "getMappingByPageSlug")
+        query = queries.first("getMappingByPageSlug")
         if not query:
-            self.logger.warning(f"parse {url} -> not found getMappingByPageSlug")
+            self.not_found(url, "getMappingByPageSlug")
             return {}
 
-        return {"ref_slug": get_nested(query, "state.data.StorePageMapping.mapping.pageSlug")}
+        return {"ref_slug": MAPPING_PAGE_SLUG.get(query)}
 
     def extract_queries(self, response: Response, url: str):
-        script_contents = cast(Any, response.xpath("//script/text()").getall())
-        self.scrapped_slugs.append(url)
-        if url not in self.slugs:
+        if not self.accepts(url):
             return {}
 
-        self.logger.info(f"parse {url} -> extract __REACT_QUERY_INITIAL_QUERIES__")
-        data = {}
-        for script_content in script_contents:
-            if "__REACT_QUERY_INITIAL_QUERIES__" in script_content:
-                self.logger.info(
-                    f"parse {url} -> saving __REACT_QUERY_INITIAL_QUERIES__ to {url}.json"
-                )
-                start_index = script_content.find("__REACT_QUERY_INITIAL_QUERIES__")
-                next_space_index = script_content.find(" ", start_index) + 2
-                next_line_index = script_content.find("\n", start_index) - 1
-                data = json.loads(script_content[next_space_index:next_line_index])
+        return self.queries_from_body(response.body, url)
 
-        queries: dict[Any, Any] = data["queries"]
+    def accepts(self, url: str) -> bool:
+        """False for pages the crawl never scheduled: a mapping redirected to a page
+        that is already known under another slug"""
+        return self.frontier is None or canonical_slug(url) in self.frontier
+
+    @timed("parse/extract_queries")
+    def queries_from_body(self, body: bytes, url: str) -> list[dict[Any, Any]]:
+        self.logger.info(f"parse {url} -> extract __REACT_QUERY_INITIAL_QUERIES__")
+        with timer(self.stats, "parse/find_payload"):
+            payload = find_queries_payload(body)
+        if payload is None:
+            raise QueriesNotFound(f"{url}: no {REACT_QUERY_MARKER} script")
+        self.logger.info(f"parse {url} -> found __REACT_QUERY_INITIAL_QUERIES__")
+        seen_queries = self.check_unchanged(payload)
+        if seen_queries is not None:
+            return seen_queries
+        try:
+            queries = self.decode(payload, url)
+        except QueriesNotFound:
+            scanned = find_queries_payload(body, scan=True)
+            if scanned is None or len(scanned) == len(payload):
+                raise
+            # more than the object on its line: decode it up to its closing bracket
+            payload = scanned
+            queries = self.decode(payload, url)
+        self.payload = payload
 
         return queries
 
+    def decode(self, payload: Payload, url: str) -> list[dict[Any, Any]]:
+        try:
+            with timer(self.stats, "parse/decode"):
+                return self.decode_queries(payload)
+        except ValueError as err:
+            raise QueriesNotFound(f"{url}: {err}") from err
+
+    def check_unchanged(self, payload: Payload) -> Optional[list[dict[Any, Any]]]:
+        """With fingerprint_pages, fingerprint the payload from its raw bytes. When it is
+        known_fingerprint, only the SEEN_QUERIES entries are decoded and returned."""
+        if not self.fingerprint_pages:
+            return None
+        with timer(self.stats, "parse/fingerprint"):
+            slices = query_slices(payload)
+            self.fingerprint = payload_fingerprint(slices)
+        self.unchanged = self.fingerprint is not None and self.fingerprint == self.known_fingerprint
+        if not self.unchanged:
+            return None
+        seen = b",".join(raw.lstrip(b" \t\r\n,") for name, raw in slices if name in SEEN_QUERIES)
+        try:
+            with timer(self.stats, "parse/decode"):
+                return self.decode_queries(b'{"queries":[' + seen + b"]}")
+        except ValueError:
+            # slices that don't decode on their own: decode the whole payload after all
+            return None
+
     def extract_queries_from_file(self, url: str):
         filename = "GameResellerScraper/test/" + url + ".json"
         p = Path(os.getcwd()) / filename
@@ -275,11 +477,141 @@ class ItemParser1(ItemParser):
             self.logger.error(f"parse {url} -> building item -> not found file", p)
             return None
 
-        text = p.read_text()
-        data: dict[Any, Any] = json.loads(text)
-        queries: dict[Any, Any] = data["queries"]
+        payload = p.read_bytes()
+        seen_queries = self.check_unchanged(payload)
+        if seen_queries is not None:
+            return seen_queries
+        return self.decode_queries(payload)
 
-        return queries
+
+class PriceParser(ItemParser1):
+    """Reads the price of the catalog offer and nothing else. Identifiers missing from
+    the offer come from the `identity` the request was made for."""
+
+    @override
+    @timed("parse/price")
+    def parse(self, response: Response, **kwargs: Any) -> Optional[PriceItem]:
+        url: str = response.url.split("/")[-1]
+        queries = self.queries_from_body(response.body, url)
+        offer = self.extract_catalog_offer(QueryIndex(queries), url)
+        if not offer:
+            return None
+        identity = response.request and response.request.cb_kwargs.get("identity")
+        price = offer.get("price") or {}
+        return PriceItem(
+            ref_namespace=offer.get("ref_namespace") or getattr(identity, "ref_namespace", None),
+            ref_id=offer.get("ref_id") or getattr(identity, "ref_id", None),
+            ref_slug=getattr(identity, "ref_slug", None) or url,
+            origin_price=price.get("origin_price"),
+            discount_price=price.get("discount_price"),
+            discount=price.get("discount"),
+            observed_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            url=url,
+        )
+
+
+def find_queries_payload(body: bytes, scan: bool = False) -> Optional[memoryview]:
+    """Locate the JSON object assigned to __REACT_QUERY_INITIAL_QUERIES__ directly in the
+    response bytes, without materialising every <script> as a string. The object ends
+    where its line does (minified, as the store renders it) or where its script does;
+    when it ends at neither, or with `scan`, its closing bracket is found by scanning
+    the JSON."""
+    marker = body.find(REACT_QUERY_MARKER_BYTES)
+    while marker != -1:
+        assignment = _ASSIGNMENT.match(body, marker + len(REACT_QUERY_MARKER_BYTES))
+        if assignment and body[assignment.end() : assignment.end() + 1] == b"{":
+            start = assignment.end()
+            end = -1
+            if not scan:
+                end = statement_end(body, start, b"\n")
+                if end == -1:
+                    end = statement_end(body, start, b"</script>")
+            if end == -1:
+                end = json_value_end(body, start)
+            if end == -1:
+                return None
+            return memoryview(body)[start:end]
+        marker = body.find(REACT_QUERY_MARKER_BYTES, marker + 1)
+
+    return None
+
+
+def statement_end(body: bytes, start: int, delimiter: bytes) -> int:
+    """Index just past the object opening at `start` when only a `;` and whitespace
+    follow it up to the next `delimiter`, -1 otherwise"""
+    end = body.find(delimiter, start)
+    if end == -1:
+        return -1
+    while end > start and body[end - 1] in _STATEMENT_TRAILER:
+        end -= 1
+    return end if body[end - 1] == 0x7D else -1  # }
+
+
+def json_value_end(body: bytes, start: int) -> int:
+    """Index just past the object or array opening at `start`, skipping brackets inside
+    strings. Returns -1 when the value is not closed before the end of `body`"""
+    depth = 0
+    pos = start
+    while True:
+        token = _JSON_BRACKET_OR_QUOTE.search(body, pos)
+        if not token:
+            return -1
+        char = body[token.start()]
+        pos = token.end()
+        if char == 0x22:  # "
+            while True:
+                string_token = _JSON_QUOTE_OR_ESCAPE.search(body, pos)
+                if not string_token:
+                    return -1
+                if body[string_token.start()] == 0x5C:  # \
+                    pos = string_token.start() + 2
+                    continue
+                pos = string_token.end()
+                break
+        elif char in (0x7B, 0x5B):  # { [
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
+
+
+def query_slices(payload: Payload) -> list[tuple[str, bytes]]:
+    """queryKey name and raw bytes of every entry of the queries list, without decoding
+    the payload: an entry runs from the end of the one before it to the end of its
+    queryHash. Empty when the payload doesn't have that shape."""
+    data = payload if isinstance(payload, bytes) else bytes(payload)
+    start = _QUERIES_START.search(data)
+    if start is None:
+        return []
+    slices: list[tuple[str, bytes]] = []
+    pos = start.end()
+    head_at = data.find(QUERY_HASH_BYTES, pos)
+    while head_at != -1:
+        head = _QUERY_HASH_HEAD.match(data, head_at)
+        end = head and _STRING_END_AND_BRACE.search(data, head.end())
+        # quotes inside the queryHash string are escaped
+        while end and data[end.start() - 1] == 0x5C:  # \
+            end = _STRING_END_AND_BRACE.search(data, end.start() + 1)
+        if not head or not end:
+            break
+        name = head.group(1) or b""
+        slices.append((name.decode(), data[pos : end.end()]))
+        pos = end.end()
+        head_at = data.find(QUERY_HASH_BYTES, pos)
+    return slices
+
+
+def payload_fingerprint(slices: list[tuple[str, bytes]]) -> Optional[str]:
+    """Hash of the raw entries of FINGERPRINT_QUERIES, without VOLATILE_KEYS. None when
+    the payload has none of them."""
+    hasher = hashlib.sha256()
+    found = False
+    for name, raw in slices:
+        if name in FINGERPRINT_QUERIES:
+            hasher.update(_VOLATILE.sub(b"", raw))
+            found = True
+    return hasher.hexdigest()[:32] if found else None
 
 
 def random_str():
@@ -292,13 +624,14 @@ def random_str():
     return result
 
 
+def query_key(query: dict[Any, Any]) -> str:
+    """queryKey is usually a list whose first element names the query, a few entries
+    (launcherVersion) use a bare string"""
+    key = query.get("queryKey")
+    if isinstance(key, list):
+        return key[0] if key else ""
+    return key if isinstance(key, str) else ""
+
+
 def get_nested(d: Optional[dict[Any, Any]], keys: str, delimiter: str = "."):
-    splited_keys = keys.split(delimiter)
-    result: Any = d
-    if not d:
-        return None
-    for key in splited_keys:
-        result = result.get(key, None)
-        if result is None:
-            return None
-    return result
+    return compile_path(keys, delimiter).get(d)
@@ -0,0 +1,91 @@
+"""Content-addressed archive of the __REACT_QUERY_INITIAL_QUERIES__ payloads.
+
+Every payload the parser decodes is stored once under its sha256, compressed, as
+`objects/<first 2 hex>/<sha256>.json[.gz|.zst]`. `index.jsonl` records each page that
+was parsed: slug, crawl time, digest, url and the base item the page was requested
+for, so the `reparse` command can rebuild the same items without crawling again.
+
+Objects are written to a temporary file and renamed into place, so parse workers and
+threads can store payloads concurrently. The index is only appended to by the spider process.
+"""
+
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional, TextIO
+
+from scrapy.http.request.json_request import json
+
+from GameResellerScraper.items import ItemRef
+from GameResellerScraper.sink import SUFFIXES, compressor, decompressor
+
+
+class PayloadArchive:
+    index_file: Optional[TextIO]
+
+    def __init__(self, path: str, compression: str = "gzip"):
+        self.path = Path(path)
+        self.compression = compression
+        self.compress = compressor(compression)
+        # opened on the first record, workers only ever store objects
+        self.index_file = None
+
+    def object_path(self, digest: str, compression: Optional[str] = None) -> Path:
+        suffix = SUFFIXES[compression or self.compression]
+        return self.path / "objects" / digest[:2] / f"{digest}.json{suffix}"
+
+    def store(self, payload: bytes) -> str:
+        """Store a payload unless it is already archived, return its digest"""
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self.object_path(digest)
+        if path.exists():
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        __ = tmp.write_bytes(self.compress(payload))
+        os.replace(tmp, path)
+        return digest
+
+    def load(self, digest: str) -> bytes:
+        for compression in SUFFIXES:
+            path = self.object_path(digest, compression)
+            if path.exists():
+                return decompressor(compression)(path.read_bytes())
+        raise KeyError(f"{digest} is not in {self.path}")
+
+    def record(self, slug: str, digest: str, url: str, base: Optional[ItemRef] = None):
+        if self.index_file is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.index_file = open(self.path / "index.jsonl", "a", encoding="utf-8")
+        entry = {
+            "slug": slug,
+            "crawled_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "digest": digest,
+            "url": url,
+            "base": base and {k: getattr(base, k) for k in ItemRef.__slots__},
+        }
+        __ = self.index_file.write(json.dumps(entry) + "\n")
+        self.index_file.flush()
+
+    def entries(self) -> Iterator[dict[str, Any]]:
+        """Index entries in the order they were recorded"""
+        index_path = self.path / "index.jsonl"
+        if not index_path.exists():
+            return
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def latest(self) -> list[dict[str, Any]]:
+        """Newest entry of every slug, in the order the slugs were first recorded"""
+        entries: dict[str, dict[str, Any]] = {}
+        for entry in self.entries():
+            entries[entry["slug"]] = entry
+        return list(entries.values())
+
+    def close(self):
+        if self.index_file is not None:
+            self.index_file.close()
+            self.index_file = None
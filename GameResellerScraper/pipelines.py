@@ -6,205 +6,358 @@
 
 # useful for handling different item types with a single interface
 
-from datetime import datetime
-from typing import cast
-from itemadapter.adapter import ItemAdapter
-from mysql.connector.abstracts import MySQLCursorAbstract
+import logging
+import time
+from typing import Any, Optional
 from scrapy import Spider
-from scrapy.http.request.json_request import json
+from scrapy.crawler import Crawler
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.signalmanager import SignalManager
+from scrapy.statscollectors import StatsCollector
+from twisted.enterprise import adbapi
+from twisted.enterprise.adbapi import ConnectionLost
+from twisted.internet.defer import Deferred, DeferredList, succeed
+from twisted.internet.threads import deferToThread
+from twisted.internet.task import LoopingCall
+from twisted.python.failure import Failure
 
-from GameResellerScraper.items import GameItem
+from GameResellerScraper.columnar import ColumnarBatch, ParquetDatasets, crawl_date
+from GameResellerScraper.items import GameItem, PriceItem, SeenItem
+from GameResellerScraper.metrics import observe
+from GameResellerScraper.pricehistory import PriceHistory
+from GameResellerScraper.signals import item_stored, store_opened
+from GameResellerScraper.sink import ShardedSink
+from GameResellerScraper.writer import CREATE_HASHES, Batch, BufferedWriter, FlushResult, item_key
 import mysql.connector
-from mysql.connector import errorcode
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_ERRORS = (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
 
 
 class GameItemPipeline:
+    """Appends items to the JSONL shards of a ShardedSink, keyed by ref_slug"""
+
+    sink: ShardedSink
+
+    def __init__(
+        self,
+        path: str = "./GameResellerScraper/data/items",
+        compression: str = "none",
+        max_items: int = 50_000,
+        max_bytes: int = 256 * 1024 * 1024,
+        frame_items: int = 500,
+    ):
+        self.path = path
+        self.compression = compression
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.frame_items = frame_items
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        return cls(
+            path=crawler.settings.get("ITEM_SINK_PATH", "./GameResellerScraper/data/items"),
+            compression=crawler.settings.get("ITEM_SINK_COMPRESSION", "none"),
+            max_items=crawler.settings.getint("ITEM_SINK_MAX_ITEMS", 50_000),
+            max_bytes=crawler.settings.getint("ITEM_SINK_MAX_BYTES", 256 * 1024 * 1024),
+            frame_items=crawler.settings.getint("ITEM_SINK_FRAME_ITEMS", 500),
+        )
+
+    def open_spider(self, _: Spider):
+        self.sink = ShardedSink(
+            self.path,
+            compression=self.compression,
+            max_items=self.max_items,
+            max_bytes=self.max_bytes,
+            frame_items=self.frame_items,
+        )
+
     def process_item(self, item: GameItem, _: Spider):
+        if isinstance(item, (SeenItem, PriceItem)):
+            return item
         ref_slug = item.get("ref_slug")
         if ref_slug == None or type(ref_slug) != str:
-            return
-        line = json.dumps(ItemAdapter(item).asdict()) + "\n"
-        with open(f"./GameResellerScraper/data/{ref_slug}.json", "w", encoding="utf-8") as f:
-            __ = f.write(line)
+            raise DropItem(f"no ref_slug in item of {item.get('url')}")
+        self.sink.add(ref_slug, item)
         return item
 
+    def close_spider(self, _: Spider):
+        # waits for the writer thread to flush the last frame
+        self.sink.close()
+
 
 class MysqlPipline:
-    def __init__(self):
-        try:
-            self.cnx = mysql.connector.connect(
-                user="root", host="127.0.0.1", database="game_reseller"
-            )
-        except mysql.connector.Error as err:
-            if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
-                print("Something is wrong with your user name or password")
-            elif err.errno == errorcode.ER_BAD_DB_ERROR:
-                print("Database does not exist")
-            else:
-                print(err)
-        else:
-            print("CONNECTED TO DATABASE")
+    """Writes items through a BufferedWriter on a twisted adbapi connection pool, so the
+    blocking mysql.connector calls run on pool threads instead of the reactor thread
+    that also drives playwright. Every item of a committed flush is announced with the
+    item_stored signal."""
 
-    def process_item(self, item: GameItem, _: Spider):
+    pending_flushes: list[Deferred]
+    spider: Optional[Spider]
+
+    def __init__(
+        self,
+        connection: Optional[dict[str, Any]] = None,
+        pool_size: int = 4,
+        max_pending_flushes: int = 2,
+        flush_rows: int = 1000,
+        flush_interval: float = 5.0,
+        identity_cache_size: int = 100_000,
+        incremental: bool = False,
+        stats: Optional[StatsCollector] = None,
+        signals: Optional[SignalManager] = None,
+    ):
+        self.writer = BufferedWriter(
+            max_rows=flush_rows,
+            max_delay=flush_interval,
+            cache_size=identity_cache_size,
+            incremental=incremental,
+        )
+        self.stats = stats
+        self.signals = signals
+        self.spider = None
+        self.flush_loop = LoopingCall(self.flush_if_due)
+        self.max_pending_flushes = max_pending_flushes
+        self.pending_flushes = []
+        # connections are opened lazily by the pool threads, a dropped connection is
+        # discarded on rollback and reopened by the next interaction
+        self.dbpool = adbapi.ConnectionPool(
+            "mysql.connector",
+            cp_min=1,
+            cp_max=pool_size,
+            cp_reconnect=True,
+            cp_noisy=False,
+            **(connection or {}),
+        )
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        __ = crawler.signals.send_catch_log(store_opened)
+        return cls(
+            connection=crawler.settings.getdict("MYSQL_CONNECTION"),
+            pool_size=crawler.settings.getint("MYSQL_POOL_SIZE", 4),
+            max_pending_flushes=crawler.settings.getint("MYSQL_MAX_PENDING_FLUSHES", 2),
+            flush_rows=crawler.settings.getint("MYSQL_FLUSH_ROWS", 1000),
+            flush_interval=crawler.settings.getfloat("MYSQL_FLUSH_INTERVAL", 5.0),
+            identity_cache_size=crawler.settings.getint("MYSQL_IDENTITY_CACHE_SIZE", 100_000),
+            incremental=crawler.settings.getbool("MYSQL_INCREMENTAL"),
+            stats=crawler.stats,
+            signals=crawler.signals,
+        )
+
+    def open_spider(self, spider: Spider):
+        self.spider = spider
+        # a time based flush for when the crawl stalls between items
+        __ = self.flush_loop.start(self.writer.max_delay, now=False)
+        if self.writer.incremental:
+            return self.dbpool.runOperation(CREATE_HASHES)
+
+    def process_item(self, item: GameItem, spider: Spider):
         if not item:
             return
-        cursor = self.cnx.cursor()
-        cursor = self.insert_item(cursor, item)
-        item_id = cursor.lastrowid
-        if not item_id:
-            cursor.close()
-            __ = self.cnx.close()
-            return
+        if isinstance(item, SeenItem):
+            return item
+        if None in item_key(item):
+            spider.logger.warning(f"mysql -> skip {item.get('url')} without ref_id/ref_namespace")
+            return item
+        if isinstance(item, PriceItem):
+            self.writer.add_price(item)
+        else:
+            self.writer.add(item)
+        self.flush_if_due()
+        if len(self.pending_flushes) >= self.max_pending_flushes:
+            # the database is behind: hold this item, and through the scraper slot the
+            # engine, until the oldest flush has finished
+            return when_done(self.pending_flushes[0]).addCallback(lambda _: item)
+        return item
 
-        if "base_item" in item:
-            self.insert_mapping(cursor, item, item_id)
-        self.insert_images(cursor, item, item_id)
-        self.insert_systems(cursor, item, item_id)
-        self.insert_reviews(cursor, item, item_id)
-        self.insert_polls(cursor, item, item_id)
+    def close_spider(self, _: Spider):
+        if self.flush_loop.running:
+            self.flush_loop.stop()
+        __ = self.flush()
+        d = DeferredList(list(self.pending_flushes))
+        # mappings whose base arrived in one of the flushes above are written by a last
+        # flush once every other one has completed
+        __ = d.addCallback(lambda _: self.flush(final=True))
+        __ = d.addCallback(lambda _: self.log_unresolved())
+        __ = d.addBoth(lambda _: self.dbpool.close())
+        return d
 
-        __ = self.cnx.commit()
-        cursor.close()
+    def log_unresolved(self):
+        for item_id, (ref_namespace, ref_id) in self.writer.deferred_mappings:
+            logger.warning(
+                f"mysql -> no base item {ref_namespace}/{ref_id} for item {item_id}, mapping dropped"
+            )
 
-    def close_spider(self, _: Spider):
-        __ = self.cnx.close()
+    def flush_if_due(self):
+        if self.writer.due():
+            __ = self.flush()
 
-    def insert_item(self, cursor: MySQLCursorAbstract, item: GameItem):
-        add_item = (
-            "INSERT INTO items "
-            "(title, ref_id, ref_namespace, developer_display_name, short_description, item_type, publisher_display_name, long_description, ref_slug, critic_avg, critic_rating, critic_recommend_pct, text, audio, sale_price, release_date, avg_rating) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-        )
-        data_item = (
-            item.get("title"),
-            item.get("ref_id"),
-            item.get("ref_namespace"),
-            item.get("developer_display_name"),
-            item.get("short_description"),
-            item.get("item_type"),
-            item.get("publisher_display_name"),
-            item.get("long_description"),
-            item.get("ref_slug"),
-            item.get("critic_avg"),
-            item.get("critic_rating"),
-            item.get("critic_recommend_pct"),
-            ",".join(item.get("supported_text") or []),
-            ",".join(item.get("supported_audio") or []),
-            (item.get("price") or {}).get("origin_price") or 0,
-            datetime.strptime(
-                item.get("release_date") or "2023-01-25T06:00:00.000Z", "%Y-%m-%dT%H:%M:%S.%fZ"
-            ),
-            item.get("avg_rating"),
-        )
-        __ = cursor.execute(add_item, data_item)
+    def flush(self, final: bool = False) -> Deferred:
+        batch = self.writer.take(final=final)
+        if not batch:
+            return succeed(None)
+        start = time.perf_counter()
+        if self.writer.incremental and self.pending_flushes:
+            # an incremental flush looks its items up before inserting the new ones, two
+            # running at once would both insert an item that is new to each of them
+            d = when_done(self.pending_flushes[-1])
+            __ = d.addCallback(lambda _: self.run_flush(batch, retries=1))
+        else:
+            d = self.run_flush(batch, retries=1)
+        self.pending_flushes.append(d)
 
-        return cursor
+        def done(result: Any):
+            self.pending_flushes.remove(d)
+            # from take to commit, including the wait for a free pool connection
+            observe(self.stats, "mysql/flush", time.perf_counter() - start)
+            return result
 
-    def insert_images(self, cursor: MySQLCursorAbstract, item: GameItem, item_id: int):
-        add_image = (
-            "INSERT INTO images "
-            "(url, image_type, alt, item_id, image_row) "
-            "VALUES (%s, %s, %s, %s, %s)"
-        )
-        for image in item.get("images") or []:
-            data_image = (image.get("url"), image.get("type"), image.get("alt"), item_id, None)
-            __ = cursor.execute(add_image, data_image)
-
-    def insert_systems(self, cursor: MySQLCursorAbstract, item: GameItem, item_id: int):
-        add_system = "INSERT INTO systems " + "(os, item_id) " + "VALUES (%s, %s)"
-        technical_requirements = item.get("technical_requirements")
-        if not technical_requirements:
-            return
-        systems = list(technical_requirements.items())
-        for system_name, details in systems or []:
-            if not details:
-                continue
-            system_data = (system_name, item_id)
-            __ = cursor.execute(add_system, system_data)
-            system_id = cursor.lastrowid
-            for detail in details:
-                add_detail = (
-                    "INSERT INTO system_details "
-                    "(title, minimum, recommended, system_id) "
-                    "VALUES (%s, %s, %s, %s)"
-                )
-                detail_data = (
-                    detail.get("title"),
-                    detail.get("minimum"),
-                    detail.get("recommended"),
-                    system_id,
-                )
-                __ = cursor.execute(add_detail, detail_data)
-
-    def insert_reviews(self, cursor: MySQLCursorAbstract, item: GameItem, item_id: int):
-        add_reviews = (
-            "INSERT INTO reviews "
-            "(author, body, outlet, earned_score, total_score, type, item_id, url) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
-        )
-        for review in item.get("critic_reviews") or []:
-            review_data = (
-                review.get("author"),
-                review.get("body"),
-                review.get("outlet"),
-                review.get("score").get("earned_score"),
-                review.get("score").get("total_score"),
-                (
-                    "star"
-                    if review.get("score").get("type") == "CriticReviewNumericScore"
-                    else "numeric"
-                ),
-                item_id,
-                review.get("url"),
+        return d.addBoth(done)
+
+    def run_flush(self, batch: Batch, retries: int) -> Deferred:
+        d = self.dbpool.runInteraction(self.writer.flush, batch)
+
+        def failed(failure: Failure):
+            if retries and failure.check(ConnectionLost, *RECONNECT_ERRORS):
+                logger.warning(f"mysql -> connection lost ({failure.getErrorMessage()}), retrying")
+                return self.run_flush(batch, retries - 1)
+            logger.error(
+                f"mysql -> flush of {len(batch.items)} items failed: {failure.getErrorMessage()}"
             )
-            __ = cursor.execute(add_reviews, review_data)
+            # the items are lost, but the mappings this batch took over from earlier
+            # flushes go back to the writer: a later flush retries them, or
+            # log_unresolved reports them
+            self.writer.deferred_mappings.extend(batch.mappings)
+            if self.stats:
+                self.stats.inc_value("mysql/items_failed", len(batch.items))
+                self.stats.inc_value("mysql/prices_failed", len(batch.prices))
+
+        return d.addCallbacks(self.complete, failed, callbackArgs=(batch,))
+
+    def complete(self, result: FlushResult, batch: Batch):
+        self.writer.complete(result)
+        if self.signals:
+            for item in batch.items:
+                __ = self.signals.send_catch_log(item_stored, item=item, spider=self.spider)
+        result.timings.record(self.stats, "mysql")
+        if self.stats:
+            self.stats.inc_value("mysql/items_new", result.new)
+            self.stats.inc_value("mysql/items_updated", result.updated)
+            self.stats.inc_value("mysql/items_unchanged", result.unchanged)
+            self.stats.inc_value("mysql/prices_updated", result.prices)
+
+
+class ParquetPipeline:
+    """Exports items and their child collections to Parquet datasets partitioned by
+    crawl date. Items are buffered into a ColumnarBatch and written as one row group
+    per dataset every `batch_items` items, on a thread so encoding doesn't hold up the
+    reactor. Writes run one at a time, in order."""
 
-    def insert_polls(self, cursor: MySQLCursorAbstract, item: GameItem, item_id: int):
-        add_polls = (
-            "INSERT INTO polls "
-            "(text, emoji, result_emoji, result_title, result_text, item_id, ref_id, ref_tag_id, ref_poll_definition_id, total) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+    def __init__(self, path: str, batch_items: int = 5000, compression: str = "snappy"):
+        self.datasets = ParquetDatasets(path, compression=compression)
+        self.batch_items = batch_items
+        self.batch = ColumnarBatch()
+        self.batch_date = crawl_date()
+        self.writing: Deferred = succeed(None)
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        path = crawler.settings.get("PARQUET_EXPORT_PATH")
+        if not path:
+            raise NotConfigured("PARQUET_EXPORT_PATH is not set")
+        try:
+            import pyarrow  # pyright: ignore[reportUnusedImport]
+        except ImportError:
+            raise NotConfigured("the Parquet export needs pyarrow")
+        return cls(
+            path,
+            batch_items=crawler.settings.getint("PARQUET_BATCH_ITEMS", 5000),
+            compression=crawler.settings.get("PARQUET_COMPRESSION", "snappy"),
         )
-        for poll in item.get("polls") or []:
-            poll_data = (
-                poll.get("text"),
-                poll.get("emoji"),
-                poll.get("result_emoji"),
-                poll.get("result_title"),
-                poll.get("result_text"),
-                item_id,
-                poll.get("ref_id"),
-                poll.get("ref_tag_id"),
-                poll.get("ref_poll_definition_id"),
-                poll.get("total"),
-            )
-            __ = cursor.execute(add_polls, poll_data)
 
-    def insert_mapping(self, cursor: MySQLCursorAbstract, item: GameItem, item_id: int):
-        add_mapping = "INSERT INTO item_mappings " + "(item_id, base_item_id)" + "VALUES (%s, %s)"
-        base_item = item.get("base_item")
-        if not base_item:
+    def process_item(self, item: GameItem, spider: Spider):
+        if not item:
             return
-        base_item_query = "SELECT ID from items WHERE title = %s AND ref_id = %s AND ref_namespace = %s ORDER BY created_at DESC"
-        base_item_query_data = (
-            base_item.get("title"),
-            base_item.get("ref_id"),
-            base_item.get("ref_namespace"),
-        )
-        __ = cursor.execute(base_item_query, base_item_query_data)
-        rows = cursor.fetchall()
+        if isinstance(item, (SeenItem, PriceItem)):
+            return item
+        if None in item_key(item):
+            spider.logger.warning(f"parquet -> skip {item.get('url')} without ref_id/ref_namespace")
+            return item
+        today = crawl_date()
+        if today != self.batch_date:
+            self.flush()
+            self.batch_date = today
+        self.batch.add(item)
+        if self.batch.items >= self.batch_items:
+            self.flush()
+        return item
+
+    def close_spider(self, _: Spider):
+        self.flush()
+        return self.writing.addCallback(lambda _: self.datasets.close())
 
-        row = rows[0]
-        if not row:
+    def flush(self):
+        if not self.batch:
             return
+        batch, batch_date = self.batch, self.batch_date
+        self.batch = ColumnarBatch()
+
+        def failed(failure: Failure):
+            logger.error(
+                f"parquet -> writing {batch.items} items failed: {failure.getErrorMessage()}"
+            )
+
+        __ = self.writing.addCallback(
+            lambda _: deferToThread(self.datasets.write, batch_date, batch)
+        ).addErrback(failed)
+
+
+class PriceHistoryPipeline:
+    """Records the price of every GameItem and PriceItem in a PriceHistory, which only
+    stores it when it changed"""
+
+    history: PriceHistory
+
+    def __init__(self, path: str, flush_rows: int = 500, stats: Optional[StatsCollector] = None):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        path = crawler.settings.get("PRICE_HISTORY_PATH")
+        if not path:
+            raise NotConfigured("PRICE_HISTORY_PATH is not set")
+        return cls(
+            path,
+            flush_rows=crawler.settings.getint("PRICE_HISTORY_FLUSH_ROWS", 500),
+            stats=crawler.stats,
+        )
+
+    def open_spider(self, _: Spider):
+        self.history = PriceHistory(self.path, flush_rows=self.flush_rows)
+
+    def process_item(self, item: GameItem, _: Spider):
+        if not item or isinstance(item, SeenItem):
+            return item
+        changed = self.history.record_item(item)
+        if self.stats:
+            self.stats.inc_value("price_history/changed" if changed else "price_history/same")
+        return item
+
+    def close_spider(self, _: Spider):
+        self.history.close()
+
 
-        base_item_id: int = -1
-        if type(row) == tuple:
-            print(row)
-            base_item_id = cast(int, row[0])
+def when_done(d: Deferred) -> Deferred:
+    """A new Deferred firing with None once `d` fires, leaving `d`'s result untouched"""
+    waiter = Deferred()
 
-        if type(row) == dict:
-            base_item_id = cast(int, row.get("ID"))
+    def fire(result: Any):
+        waiter.callback(None)
+        return result
 
-        mapping_data = (item_id, base_item_id)
-        __ = cursor.execute(add_mapping, mapping_data)
+    __ = d.addBoth(fire)
+    return waiter
@@ -0,0 +1,225 @@
+"""Price history of every item, in SQLite.
+
+`price_observations` gets a row only when an item's (origin_price, discount_price,
+discount) differs from its last recorded one, so a series is a step function: a price
+holds until the next row. `compact` rolls observations older than a cutoff into
+`price_daily`, one row per item and day with the min/max of each value, and always
+keeps the newest observation of an item so changes can still be detected. The tags of
+every GameItem are kept in `item_tags`, for series by tag.
+"""
+
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+from GameResellerScraper.items import GameItem, PriceItem
+
+ItemKey = tuple[str, str]
+Price = tuple[Optional[int], Optional[int], Optional[int]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_observations (
+    ref_namespace TEXT NOT NULL,
+    ref_id TEXT NOT NULL,
+    observed_at REAL NOT NULL,
+    origin_price INTEGER,
+    discount_price INTEGER,
+    discount INTEGER,
+    PRIMARY KEY (ref_namespace, ref_id, observed_at)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS price_daily (
+    ref_namespace TEXT NOT NULL,
+    ref_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    origin_min INTEGER,
+    origin_max INTEGER,
+    discount_price_min INTEGER,
+    discount_price_max INTEGER,
+    discount_min INTEGER,
+    discount_max INTEGER,
+    observations INTEGER NOT NULL,
+    PRIMARY KEY (ref_namespace, ref_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS item_tags (
+    tag_id TEXT NOT NULL,
+    ref_namespace TEXT NOT NULL,
+    ref_id TEXT NOT NULL,
+    name TEXT,
+    PRIMARY KEY (tag_id, ref_namespace, ref_id)
+) WITHOUT ROWID;
+"""
+
+INSERT_OBSERVATION = (
+    "INSERT OR REPLACE INTO price_observations "
+    "(ref_namespace, ref_id, observed_at, origin_price, discount_price, discount) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+INSERT_TAG = (
+    "INSERT OR REPLACE INTO item_tags (tag_id, ref_namespace, ref_id, name) VALUES (?, ?, ?, ?)"
+)
+
+# observations older than the cutoff, but not the newest one of their item
+COMPACTABLE = (
+    "FROM price_observations AS o WHERE o.observed_at < :before AND o.observed_at < ("
+    "SELECT MAX(observed_at) FROM price_observations AS n "
+    "WHERE n.ref_namespace = o.ref_namespace AND n.ref_id = o.ref_id)"
+)
+COMPACT = (
+    "INSERT INTO price_daily "
+    "SELECT ref_namespace, ref_id, date(observed_at, 'unixepoch') AS day, "
+    "MIN(origin_price), MAX(origin_price), MIN(discount_price), MAX(discount_price), "
+    "MIN(discount), MAX(discount), COUNT(*) "
+    + COMPACTABLE
+    + " GROUP BY ref_namespace, ref_id, day "
+    "ON CONFLICT (ref_namespace, ref_id, day) DO UPDATE SET "
+    "origin_min = MIN(origin_min, excluded.origin_min), "
+    "origin_max = MAX(origin_max, excluded.origin_max), "
+    "discount_price_min = MIN(discount_price_min, excluded.discount_price_min), "
+    "discount_price_max = MAX(discount_price_max, excluded.discount_price_max), "
+    "discount_min = MIN(discount_min, excluded.discount_min), "
+    "discount_max = MAX(discount_max, excluded.discount_max), "
+    "observations = observations + excluded.observations"
+)
+
+
+class PriceRange(NamedTuple):
+    """Prices of an item over a day (compacted) or at one observation (start == end)"""
+
+    ref_namespace: str
+    ref_id: str
+    start: str
+    end: str
+    origin_min: Optional[int]
+    origin_max: Optional[int]
+    discount_price_min: Optional[int]
+    discount_price_max: Optional[int]
+    discount_min: Optional[int]
+    discount_max: Optional[int]
+    observations: int
+
+
+class PriceHistory:
+    """Writes are buffered and committed every `flush_rows` rows; the last price of
+    every item is kept in memory to decide whether an observation is a change."""
+
+    last: dict[ItemKey, Price]
+    observations: list[tuple[Any, ...]]
+    tags: list[tuple[Any, ...]]
+
+    def __init__(self, path: str = ":memory:", flush_rows: int = 500):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        __ = self.db.execute("PRAGMA journal_mode=WAL")
+        __ = self.db.execute("PRAGMA synchronous=NORMAL")
+        __ = self.db.executescript(SCHEMA)
+        self.flush_rows = flush_rows
+        self.observations = []
+        self.tags = []
+        self.last = {}
+        for ref_namespace, ref_id, *price in self.db.execute(
+            "SELECT o.ref_namespace, o.ref_id, o.origin_price, o.discount_price, o.discount "
+            "FROM price_observations AS o JOIN ("
+            "SELECT ref_namespace, ref_id, MAX(observed_at) AS observed_at "
+            "FROM price_observations GROUP BY ref_namespace, ref_id"
+            ") AS n USING (ref_namespace, ref_id, observed_at)"
+        ):
+            self.last[(ref_namespace, ref_id)] = tuple(price)
+
+    def record(self, key: ItemKey, price: Price, observed_at: Optional[float] = None) -> bool:
+        """Queue an observation if the price differs from the item's last one"""
+        if self.last.get(key) == price:
+            return False
+        self.last[key] = price
+        self.observations.append(key + (observed_at or time.time(),) + price)
+        self.flush_if_due()
+        return True
+
+    def record_item(self, item: Any) -> bool:
+        """Record the price of a GameItem or PriceItem, and the tags of a GameItem"""
+        key = (item.get("ref_namespace"), item.get("ref_id"))
+        if None in key:
+            return False
+        if isinstance(item, PriceItem):
+            price = (item.get("origin_price"), item.get("discount_price"), item.get("discount"))
+            observed_at = timestamp(item.get("observed_at"))
+        else:
+            values = item.get("price") or {}
+            price = (
+                values.get("origin_price"),
+                values.get("discount_price"),
+                values.get("discount"),
+            )
+            observed_at = None
+        if isinstance(item, GameItem):
+            self.tags.extend(
+                (tag.get("ref_id"), *key, tag.get("name"))
+                for tag in item.get("tags") or []
+                if tag.get("ref_id") is not None
+            )
+        return self.record(key, price, observed_at)
+
+    def flush_if_due(self):
+        if len(self.observations) + len(self.tags) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        with self.db:
+            __ = self.db.executemany(INSERT_OBSERVATION, self.observations)
+            __ = self.db.executemany(INSERT_TAG, self.tags)
+        self.observations = []
+        self.tags = []
+
+    def compact(self, before: float) -> int:
+        """Roll observations older than `before` into daily ranges, return how many"""
+        self.flush()
+        with self.db:
+            __ = self.db.execute(COMPACT, {"before": before})
+            cursor = self.db.execute("DELETE " + COMPACTABLE, {"before": before})
+        return cursor.rowcount
+
+    def series(
+        self, ref_namespace: str, ref_id: str, since: Optional[str] = None
+    ) -> list[PriceRange]:
+        """Daily ranges and observations of an item, oldest first. `since` is an ISO
+        date."""
+        self.flush()
+        since = since or "0000-00-00"
+        rows = self.db.execute(
+            "SELECT ref_namespace, ref_id, day, day, origin_min, origin_max, "
+            "discount_price_min, discount_price_max, discount_min, discount_max, observations "
+            "FROM price_daily WHERE ref_namespace = ? AND ref_id = ? AND day >= ? "
+            "UNION ALL "
+            "SELECT ref_namespace, ref_id, at, at, "
+            "origin_price, origin_price, discount_price, discount_price, discount, discount, 1 "
+            "FROM (SELECT *, strftime('%Y-%m-%dT%H:%M:%SZ', observed_at, 'unixepoch') AS at "
+            "FROM price_observations WHERE ref_namespace = ? AND ref_id = ?) WHERE at >= ? "
+            "ORDER BY 3",
+            (ref_namespace, ref_id, since, ref_namespace, ref_id, since),
+        )
+        return [PriceRange(*row) for row in rows]
+
+    def tag_series(
+        self, tag_id: str, since: Optional[str] = None
+    ) -> dict[ItemKey, list[PriceRange]]:
+        """Series of every item with the tag"""
+        self.flush()
+        keys = self.db.execute(
+            "SELECT ref_namespace, ref_id FROM item_tags WHERE tag_id = ?", (tag_id,)
+        ).fetchall()
+        return {(ns, ref_id): self.series(ns, ref_id, since) for ns, ref_id in keys}
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+def timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    observed_at = datetime.fromisoformat(value)
+    if observed_at.tzinfo is None:
+        observed_at = observed_at.replace(tzinfo=timezone.utc)
+    return observed_at.timestamp()
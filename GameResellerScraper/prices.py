@@ -0,0 +1,52 @@
+"""Known items for the game-price spider.
+
+A price refresh doesn't discover anything: it revisits the (ref_namespace, ref_id,
+ref_slug) of items an earlier full crawl stored, read from MySQL (PRICE_IDENTITY_SOURCE
+= "mysql") or from the item sink (= "sink").
+"""
+
+from typing import Any, NamedTuple, Optional
+
+from GameResellerScraper.sink import read_items
+
+SELECT_IDENTITIES = (
+    "SELECT ref_namespace, ref_id, MAX(ref_slug) FROM items "
+    "WHERE ref_slug IS NOT NULL AND ref_namespace IS NOT NULL AND ref_id IS NOT NULL "
+    "GROUP BY ref_namespace, ref_id"
+)
+
+
+class Identity(NamedTuple):
+    ref_namespace: str
+    ref_id: str
+    ref_slug: str
+
+
+def identities_from_mysql(connection: Optional[dict[str, Any]]) -> list[Identity]:
+    import mysql.connector
+
+    db = mysql.connector.connect(**(connection or {}))
+    try:
+        cursor = db.cursor()
+        cursor.execute(SELECT_IDENTITIES)
+        return [Identity(*row) for row in cursor.fetchall()]
+    finally:
+        db.close()
+
+
+def identities_from_sink(path: str) -> list[Identity]:
+    identities: list[Identity] = []
+    for slug, item in read_items(path):
+        if item.get("ref_namespace") and item.get("ref_id"):
+            identities.append(Identity(item["ref_namespace"], item["ref_id"], slug))
+    return identities
+
+
+def known_identities(source: str, settings: Any) -> list[Identity]:
+    if source == "mysql":
+        return identities_from_mysql(settings.getdict("MYSQL_CONNECTION"))
+    if source == "sink":
+        return identities_from_sink(
+            settings.get("ITEM_SINK_PATH", "./GameResellerScraper/data/items")
+        )
+    raise ValueError(f"unknown identity source {source!r}, expected 'mysql' or 'sink'")
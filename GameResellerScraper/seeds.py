@@ -0,0 +1,101 @@
+"""Seed slugs for the game-item spider.
+
+A seed source is either a text file with one slug or store URL per line (blank lines
+and `#` comments are skipped), or a recorded catalog-listing payload: the JSON response
+of the store's searchStore query, or a list of them for a paged listing, as `.json` or
+`.json.gz`. Text files are read line by line, so a catalog-sized list is never held in
+memory. Listing elements also carry their offerType, and an add-on is given the
+ItemRef of the BASE_GAME element of its namespace, when the listing has one, so its
+base_item resolves although it isn't reached through its base game's mappings.
+"""
+
+import gzip
+from typing import IO, Any, Iterator, NamedTuple, Optional
+
+from scrapy.http.request.json_request import json
+
+from GameResellerScraper.frontier import canonical_slug
+from GameResellerScraper.items import ItemRef
+
+BASE_GAME = "BASE_GAME"
+# pageType of a base game's page in catalogNs mappings, add-ons and DLCs are "offer"
+PRODUCT_HOME = "productHome"
+
+
+class Seed(NamedTuple):
+    slug: str
+    offer_type: Optional[str] = None
+    base_item: Optional[ItemRef] = None
+
+    @property
+    def base_game(self) -> bool:
+        """Seeds of unknown type are taken for base games"""
+        return self.offer_type in (None, BASE_GAME)
+
+
+def is_base_game_page(mapping: dict[str, Any]) -> bool:
+    return mapping.get("pageType") == PRODUCT_HOME
+
+
+def open_seeds(path: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def read_seeds(path: str) -> Iterator[Seed]:
+    """Seeds of a text file or catalog-listing payload, in file order"""
+    if path.removesuffix(".gz").endswith(".json"):
+        with open_seeds(path) as file:
+            payload = json.load(file)
+        yield from listing_seeds(payload)
+        return
+    with open_seeds(path) as file:
+        for line in file:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                yield Seed(canonical_slug(line))
+
+
+def listing_seeds(payload: Any) -> Iterator[Seed]:
+    elements = list(listing_elements(payload))
+    bases = {
+        element.get("namespace"): ItemRef(
+            element.get("title"), element.get("id"), element.get("namespace")
+        )
+        for element in elements
+        if element.get("offerType") == BASE_GAME
+    }
+    # the engine pulls seeds one at a time, priorities can't reorder those it hasn't
+    # pulled yet, so a listing, which is in memory anyway, yields its base games first
+    elements.sort(key=lambda element: element.get("offerType") != BASE_GAME)
+    for element in elements:
+        slug = element_slug(element)
+        if not slug:
+            continue
+        offer_type = element.get("offerType")
+        base_item = None if offer_type == BASE_GAME else bases.get(element.get("namespace"))
+        yield Seed(slug, offer_type, base_item)
+
+
+def listing_elements(payload: Any) -> Iterator[dict[str, Any]]:
+    if isinstance(payload, list):
+        for page in payload:
+            yield from listing_elements(page)
+        return
+    search_store = ((payload.get("data") or {}).get("Catalog") or {}).get("searchStore") or {}
+    yield from search_store.get("elements") or []
+
+
+def element_slug(element: dict[str, Any]) -> Optional[str]:
+    """Store page of a listing element. An add-on's catalogNs mappings point to its base
+    game's page, so its own offer mapping comes first."""
+    for mapping in element.get("offerMappings") or []:
+        if mapping.get("pageSlug"):
+            return canonical_slug(mapping["pageSlug"])
+    if element.get("productSlug"):
+        return canonical_slug(element["productSlug"])
+    for mapping in (element.get("catalogNs") or {}).get("mappings") or []:
+        if is_base_game_page(mapping) and mapping.get("pageSlug"):
+            return canonical_slug(mapping["pageSlug"])
+    return None
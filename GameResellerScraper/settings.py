@@ -2,6 +2,8 @@ import os
 from os.path import join, dirname
 from dotenv import load_dotenv
 
+from GameResellerScraper.browser import AbortProfile
+
 dotenv_path = join(dirname(__file__), '.env')
 load_dotenv(dotenv_path)
 # Scrapy settings for GameResellerScraper project
@@ -17,6 +19,7 @@ BOT_NAME = "GameResellerScraper"
 
 SPIDER_MODULES = ["GameResellerScraper.spiders"]
 NEWSPIDER_MODULE = "GameResellerScraper.spiders"
+COMMANDS_MODULE = "GameResellerScraper.commands"
 
 
 # Crawl responsibly by identifying yourself (and your website) on the user-agent
@@ -58,26 +61,126 @@ COOKIES_ENABLED = False
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
     "GameResellerScraper.middlewares.GameResellerScraperDownloaderMiddleware": 543,
+    "GameResellerScraper.browser.ContextPoolMiddleware": 900,
+    "GameResellerScraper.middlewares.HttpArchiveMiddleware": 950,
 }
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    #    "scrapy.extensions.telnet.TelnetConsole": None,
+    "GameResellerScraper.metrics.Metrics": 500,
+    "GameResellerScraper.browser.PlaywrightProfile": 510,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     "GameResellerScraper.pipelines.GameItemPipeline": 300,
     "GameResellerScraper.pipelines.MysqlPipline": 310,
+    "GameResellerScraper.pipelines.ParquetPipeline": 320,
 }
 
+# GameItemPipeline appends items to JSONL shards in ITEM_SINK_PATH, starting a new shard
+# after ITEM_SINK_MAX_ITEMS items or ITEM_SINK_MAX_BYTES bytes. Every
+# ITEM_SINK_FRAME_ITEMS lines are written as one frame, compressed with
+# ITEM_SINK_COMPRESSION: "none", "gzip" or "zstd" (needs the zstandard package)
+ITEM_SINK_PATH = "./GameResellerScraper/data/items"
+ITEM_SINK_COMPRESSION = "none"
+ITEM_SINK_MAX_ITEMS = 50_000
+ITEM_SINK_MAX_BYTES = 256 * 1024 * 1024
+ITEM_SINK_FRAME_ITEMS = 500
+
+# ParquetPipeline exports items, images, reviews, polls and system_details to Parquet
+# datasets under PARQUET_EXPORT_PATH, partitioned by crawl_date, with a row group every
+# PARQUET_BATCH_ITEMS items. Needs pyarrow, disabled while the path is unset
+PARQUET_EXPORT_PATH = os.environ.get("PARQUET_EXPORT_PATH")
+PARQUET_BATCH_ITEMS = 5000
+PARQUET_COMPRESSION = "snappy"
+
+# Price changes of every item, see GameResellerScraper.pricehistory. Only game-price
+# enables PriceHistoryPipeline, add it to ITEM_PIPELINES at 330 to also record the prices
+# of game-item crawls. `scrapy price-history compact` rolls observations older than
+# PRICE_HISTORY_RAW_DAYS into daily min/max ranges, `scrapy price-history series` prints
+# the series of an item or tag
+PRICE_HISTORY_PATH = "./GameResellerScraper/data/prices.sqlite"
+PRICE_HISTORY_FLUSH_ROWS = 500
+PRICE_HISTORY_RAW_DAYS = 30
+
+# MysqlPipline runs its writes on a pool of MYSQL_POOL_SIZE connections. Items wait for
+# the database once MYSQL_MAX_PENDING_FLUSHES flushes are in flight.
+MYSQL_CONNECTION = {"user": "root", "host": "127.0.0.1", "database": "game_reseller"}
+MYSQL_POOL_SIZE = 4
+MYSQL_MAX_PENDING_FLUSHES = 2
+
+# MysqlPipline buffers rows and writes them with one executemany per table once this
+# many rows are pending, or MYSQL_FLUSH_INTERVAL seconds after the first buffered item
+MYSQL_FLUSH_ROWS = 1000
+MYSQL_FLUSH_INTERVAL = 5.0
+# items.ID of recently written items by (ref_namespace, ref_id), used to map DLCs and
+# add-ons to their base game without querying the database
+MYSQL_IDENTITY_CACHE_SIZE = 100_000
+# Upsert items on (ref_namespace, ref_id) and only rewrite the child collections whose
+# content hash changed since the last crawl, hashes are kept in the item_hashes table.
+# Flushes then run one at a time, so two of them never insert the same new item
+MYSQL_INCREMENTAL = False
+
 DOWNLOAD_HANDLERS = {
     "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
     "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
 }
 
+# Fetch product pages with the plain HTTP downloader first and only re-queue them
+# through playwright when __REACT_QUERY_INITIAL_QUERIES__ is missing or fails to decode.
+# Requests without meta["playwright"] are passed to scrapy's default HTTP handler by
+# ScrapyPlaywrightDownloadHandler. The HTTP attempt is not retried (meta["dont_retry"]), a
+# challenged or failed page is rendered right away and only the rendered request is
+# retried.
+HYBRID_DOWNLOAD = True
+
+# Crawl state of every slug (queued, in flight, done, failed) and when it was last
+# fetched. A killed crawl resumes from here, FRONTIER_RESUME = False starts over. A crawl
+# that finished resets the states, so the next one starts over too.
+FRONTIER_PATH = "./GameResellerScraper/data/frontier.sqlite"
+FRONTIER_RESUME = True
+
+# game-item crawls the seeds of SEED_PATH (or `-a seeds=PATH`): a text file with a slug or
+# store URL per line, or a recorded catalog-listing payload (.json, .json.gz), see
+# GameResellerScraper.seeds. Without one it starts from SEED_SLUGS. Base games are
+# scheduled SEED_BASE_GAME_PRIORITY ahead of add-ons, and slugs not fetched in the last
+# SEED_STALE_AFTER seconds SEED_STALE_PRIORITY ahead of fresh ones.
+SEED_PATH = os.environ.get("SEED_PATH")
+SEED_SLUGS = ["rain-world-4c860c"]
+SEED_BASE_GAME_PRIORITY = 20
+SEED_STALE_PRIORITY = 10
+SEED_STALE_AFTER = 24 * 60 * 60
+
+# Decoder for the __REACT_QUERY_INITIAL_QUERIES__ payload: "stdlib", "orjson" or "msgspec".
+# msgspec only decodes the queries ItemParser1 reads, into the structs of
+# GameResellerScraper.structs that cover the fields its extractors read, and skips the
+# rest of the payload.
+JSON_BACKEND = "stdlib"
+# Parse pages on a pool of this many worker processes, 0 parses them on the reactor
+# thread
+PARSE_WORKERS = 0
+# Opt-in: pages whose fingerprint (the raw queries ItemParser1 reads, without volatile
+# keys) matches the one the frontier saved once the last crawl stored their item yield a
+# SeenItem instead of a GameItem, their mappings are still followed. Only then are
+# pages fingerprinted. Leave it off for a crawl that has to rewrite every page, after a
+# schema change or a writer fix
+SKIP_UNCHANGED_PAGES = False
+
+# Where the game-price spider gets the items to refresh: "mysql" (the items table) or
+# "sink" (ITEM_SINK_PATH). Pages missing the query script are rendered with playwright
+# unless PRICE_PLAYWRIGHT_FALLBACK is off
+PRICE_IDENTITY_SOURCE = "mysql"
+PRICE_PLAYWRIGHT_FALLBACK = True
+
+# Every decoded __REACT_QUERY_INITIAL_QUERIES__ payload is archived here, content-addressed
+# and compressed ("none", "gzip" or "zstd"), for `scrapy reparse`. Unset to disable
+PAYLOAD_ARCHIVE_PATH = "./GameResellerScraper/data/payloads"
+PAYLOAD_ARCHIVE_COMPRESSION = "gzip"
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 # AUTOTHROTTLE_ENABLED = True
@@ -110,4 +213,58 @@ PLAYWRIGHT_LAUNCH_OPTIONS = {
 }
 
 PLAYWRIGHT_BROWSER_TYPE = "firefox"
+# Rendered pages only need their HTML: images, media, fonts and requests to other hosts
+# are aborted. Cloudflare's challenge stays allowed, the fallback is often hit because
+# the plain HTTP request was challenged
+PLAYWRIGHT_ABORT_REQUEST = AbortProfile(
+    resource_types=["image", "media", "font"],
+    hosts=["store.epicgames.com", "challenges.cloudflare.com"],
+)
+# playwright_profile/bytes_saved adds up the Content-Length of the aborted requests. Most
+# of them are GETs without one, those count as the size of their resource type below and
+# are counted in playwright_profile/bytes_saved/estimated. The sizes are typical transfer
+# sizes, replace them with the averages of a full load of a store page (a HAR of the
+# page with nothing aborted) to tune the profile
+PLAYWRIGHT_ABORT_BASELINE_BYTES = {
+    "image": 60_000,
+    "media": 400_000,
+    "font": 40_000,
+    "script": 30_000,
+    "stylesheet": 15_000,
+    "xhr": 5_000,
+    "fetch": 5_000,
+}
+# The query script is part of the server-rendered HTML, the page is read once that is
+# parsed instead of waiting for the load event. scrapy-playwright waits for "load" after
+# every PageMethod, so this is the earliest point a wait can stop at
+PLAYWRIGHT_WAIT_UNTIL = "domcontentloaded"
+# Rendered pages share PLAYWRIGHT_POOL_CONTEXTS contexts of
+# PLAYWRIGHT_POOL_PAGES_PER_CONTEXT reusable pages (ContextPoolMiddleware). Unlike
+# scrapy-playwright's PLAYWRIGHT_MAX_PAGES_PER_CONTEXT, the pages stay open between
+# requests and also bound the rendered requests in flight. A context is replaced after
+# PLAYWRIGHT_CONTEXT_MAX_NAVIGATIONS navigations, or when the browser processes use more
+# than PLAYWRIGHT_BROWSER_MAX_RSS bytes, checked every PLAYWRIGHT_RSS_CHECK_INTERVAL
+# seconds. 0 disables either limit. PLAYWRIGHT_MAX_CONTEXTS is left unset: a replaced
+# context stays open until its last page is done, next to its successor
+PLAYWRIGHT_POOL_CONTEXTS = 2
+PLAYWRIGHT_POOL_PAGES_PER_CONTEXT = 4
+PLAYWRIGHT_CONTEXT_MAX_NAVIGATIONS = 500
+PLAYWRIGHT_BROWSER_MAX_RSS = 2 * 1024 * 1024 * 1024
+PLAYWRIGHT_RSS_CHECK_INTERVAL = 30
 IS_MOCK = os.environ.get("IS_MOCK")
+
+# "record" stores every downloaded response in HTTP_ARCHIVE_PATH, "replay" serves them
+# back with a simulated latency so the whole spider -> parser -> pipeline chain can run
+# without network
+HTTP_ARCHIVE_MODE = os.environ.get("HTTP_ARCHIVE_MODE")
+HTTP_ARCHIVE_PATH = "./GameResellerScraper/data/http-archive"
+HTTP_ARCHIVE_LATENCY = 0.0
+HTTP_ARCHIVE_LATENCY_JITTER = 0.0
+
+# Stage timings and counters are always kept in the crawl stats. Opt-in: METRICS_ENABLED
+# also serves them in the Prometheus text format on
+# http://METRICS_HOST:METRICS_PORT/metrics, like TELNETCONSOLE_PORT the port is the
+# first free one of the range
+METRICS_ENABLED = False
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = [9410, 9420]
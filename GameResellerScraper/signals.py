@@ -0,0 +1,7 @@
+"""Signals sent by this project's components, next to the ones in scrapy.signals"""
+
+# sent by MysqlPipline for every item of a committed flush. Args: item, spider
+item_stored = object()
+# sent by MysqlPipline when it is created, before any item is scraped: items then count
+# as stored once item_stored is sent for them, not once they are scraped. No args
+store_opened = object()
@@ -0,0 +1,211 @@
+"""Append-only JSONL shards for scraped items.
+
+Items are appended to `items-00001.jsonl` (`.gz`/`.zst` when compressed) in the sink
+directory, a new shard is started once the current one holds `max_items` items or
+`max_bytes` bytes. Lines are written in frames, one per flush, and a compressed frame
+is a complete gzip member or zstd frame, so a shard is a valid .gz/.zst file that
+plain zcat/zstdcat can stream.
+
+`index.jsonl` maps each slug to its frame (shard, offset, length) and to the line's
+position inside the uncompressed frame, so one item can be read back without
+decompressing the whole shard. A slug written again points to its newest copy.
+"""
+
+import dataclasses
+import gzip
+import logging
+import queue
+import re
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator, Optional
+
+from scrapy.http.request.json_request import json
+
+logger = logging.getLogger(__name__)
+
+SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+_SHARD_NUMBER = re.compile(r"items-(\d+)\.jsonl")
+
+# (slug, line) queued by the pipeline, None asks the writer to stop
+Record = Optional[tuple[str, bytes]]
+
+
+def compressor(compression: str) -> Callable[[bytes], bytes]:
+    if compression == "none":
+        return lambda data: data
+    if compression == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3).compress
+    raise ValueError(f"unknown compression {compression!r}, expected one of {list(SUFFIXES)}")
+
+
+def decompressor(compression: str) -> Callable[[bytes], bytes]:
+    if compression == "none":
+        return lambda data: data
+    if compression == "gzip":
+        return gzip.decompress
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"unknown compression {compression!r}, expected one of {list(SUFFIXES)}")
+
+
+def jsonable(value: Any) -> Any:
+    """json.dumps fallback for the nested items of a GameItem: much cheaper than
+    ItemAdapter.asdict, which checks every nested value against every item type"""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ShardedSink:
+    """Buffers lines on the calling thread and writes them from a background thread"""
+
+    records: "queue.Queue[Record]"
+    shard: Optional[BinaryIO]
+
+    def __init__(
+        self,
+        path: str,
+        compression: str = "none",
+        max_items: int = 50_000,
+        max_bytes: int = 256 * 1024 * 1024,
+        frame_items: int = 500,
+        flush_interval: float = 1.0,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self.compress = compressor(compression)
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.frame_items = frame_items
+        self.flush_interval = flush_interval
+        # a new crawl starts a new shard, compressed shards are never appended to
+        self.shard_number = max(
+            (int(m.group(1)) for p in self.path.iterdir() if (m := _SHARD_NUMBER.match(p.name))),
+            default=0,
+        )
+        self.shard = None
+        self.shard_items = 0
+        self.index_file = open(self.path / "index.jsonl", "a", encoding="utf-8")
+        self.records = queue.Queue()
+        self.writer = threading.Thread(target=self.run, name="item-sink", daemon=True)
+        self.writer.start()
+
+    def add(self, slug: str, item: Mapping[str, Any]):
+        # serialized here, the item may still be changed by later pipelines
+        self.records.put((slug, json.dumps(dict(item), default=jsonable).encode() + b"\n"))
+
+    def close(self):
+        """Flush what is queued and stop the writer"""
+        self.records.put(None)
+        self.writer.join()
+        if self.shard is not None:
+            self.shard.close()
+        self.index_file.close()
+
+    def run(self):
+        frame: list[tuple[str, bytes]] = []
+        while True:
+            try:
+                record = self.records.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # the crawl has gone quiet, don't keep a partial frame in memory
+                frame = self.flush(frame)
+                continue
+            if record is None:
+                __ = self.flush(frame)
+                return
+            frame.append(record)
+            if len(frame) >= self.frame_items:
+                frame = self.flush(frame)
+
+    def flush(self, frame: list[tuple[str, bytes]]) -> list[tuple[str, bytes]]:
+        if frame:
+            try:
+                self.write_frame(frame)
+            except OSError as err:
+                logger.error(f"sink -> writing {len(frame)} items failed: {err}")
+        return []
+
+    def write_frame(self, frame: list[tuple[str, bytes]]):
+        shard = self.current_shard()
+        data = b"".join(line for _, line in frame)
+        compressed = self.compress(data)
+        offset = shard.tell()
+        __ = shard.write(compressed)
+        shard.flush()
+        self.shard_items += len(frame)
+
+        position = 0
+        entries: list[str] = []
+        for slug, line in frame:
+            entry = {
+                "slug": slug,
+                "shard": Path(shard.name).name,
+                "frame": [offset, len(compressed)],
+                "line": [position, len(line)],
+            }
+            entries.append(json.dumps(entry) + "\n")
+            position += len(line)
+        __ = self.index_file.write("".join(entries))
+        self.index_file.flush()
+
+        if self.shard_items >= self.max_items or shard.tell() >= self.max_bytes:
+            shard.close()
+            self.shard = None
+
+    def current_shard(self) -> BinaryIO:
+        if self.shard is None:
+            self.shard_number += 1
+            self.shard_items = 0
+            name = f"items-{self.shard_number:05d}.jsonl{SUFFIXES[self.compression]}"
+            self.shard = open(self.path / name, "ab")
+        return self.shard
+
+
+def read_index(path: str) -> dict[str, dict[str, Any]]:
+    """Newest index entry of every slug in the sink at `path`"""
+    entries: dict[str, dict[str, Any]] = {}
+    with open(Path(path) / "index.jsonl", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            entries[entry["slug"]] = entry
+    return entries
+
+
+def read_item(path: str, entry: dict[str, Any]) -> dict[str, Any]:
+    """The item an index entry points to"""
+    start, size = entry["line"]
+    frame = read_frame(path, entry["shard"], *entry["frame"])
+    return json.loads(frame[start : start + size])
+
+
+def read_items(path: str) -> Iterator[tuple[str, dict[str, Any]]]:
+    """(slug, item) of the newest copy of every item, each frame decompressed once"""
+    frames: dict[tuple[str, int, int], list[tuple[str, int, int]]] = {}
+    for slug, entry in read_index(path).items():
+        frames.setdefault((entry["shard"], *entry["frame"]), []).append((slug, *entry["line"]))
+    for (shard, offset, length), lines in frames.items():
+        frame = read_frame(path, shard, offset, length)
+        for slug, start, size in lines:
+            yield slug, json.loads(frame[start : start + size])
+
+
+def read_frame(path: str, shard: str, offset: int, length: int) -> bytes:
+    compression = next(
+        (name for name, suffix in SUFFIXES.items() if suffix and shard.endswith(suffix)), "none"
+    )
+    with open(Path(path) / shard, "rb") as f:
+        __ = f.seek(offset)
+        return decompressor(compression)(f.read(length))
@@ -1,40 +1,268 @@
-from typing import Any
+import time
+from typing import Any, Iterator, Optional, cast
 from typing_extensions import override
 
 import scrapy
 
+from scrapy import signals
+from scrapy.crawler import Crawler
 from scrapy.http import Response
+from scrapy.spidermiddlewares.httperror import HttpError
+from twisted.python.failure import Failure
 
-from GameResellerScraper.items import GameItem
-from GameResellerScraper.parser import ItemParser1
+from GameResellerScraper.browser import http_meta, render_meta
+from GameResellerScraper.decoders import get_decoder
+from GameResellerScraper.frontier import (
+    DONE,
+    FAILED,
+    IN_FLIGHT,
+    QUEUED,
+    Frontier,
+    canonical_slug,
+)
+from GameResellerScraper.items import GameItem, ItemRef
+from GameResellerScraper.offload import ParsePool
+from GameResellerScraper.parser import ItemParser1, QueriesNotFound
+from GameResellerScraper.payloads import PayloadArchive
+from GameResellerScraper.seeds import Seed, is_base_game_page, read_seeds
+from GameResellerScraper.signals import item_stored, store_opened
 
 
 class GameResellerScraper(scrapy.Spider):
+    """Crawls the seeds of SEED_PATH, or `-a seeds=PATH`, falling back to SEED_SLUGS,
+    and every page reached through their mappings"""
+
     name = "game-item"
     host = "https://store.epicgames.com/en-US/p/"
-    slugs = ["rain-world-4c860c"]
-    scrapped_slugs = []
+    frontier: Frontier
+    parse_pool: ParsePool
+    payloads: Optional[PayloadArchive]
+    # (ref_namespace, ref_id) -> (slug, fingerprint) of parsed items not stored yet
+    unsaved_fingerprints: dict[tuple[Any, Any], tuple[str, str]]
+    # set once a pipeline that stores items and sends item_stored is opened
+    stored_by_pipeline: bool
+
+    def __init__(self, seeds: Optional[str] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.seed_path = seeds
+        self.unsaved_fingerprints = {}
+        self.stored_by_pipeline = False
+
+    @classmethod
+    @override
+    def from_crawler(cls, crawler: Crawler, *args: Any, **kwargs: Any):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.frontier = Frontier(crawler.settings.get("FRONTIER_PATH", ":memory:"))
+        if not crawler.settings.getbool("FRONTIER_RESUME", True):
+            spider.frontier.reset()
+        spider.parse_pool = ParsePool(
+            workers=crawler.settings.getint("PARSE_WORKERS"),
+            backend=crawler.settings.get("JSON_BACKEND", "stdlib"),
+        )
+        archive_path = crawler.settings.get("PAYLOAD_ARCHIVE_PATH")
+        spider.payloads = (
+            PayloadArchive(
+                archive_path, crawler.settings.get("PAYLOAD_ARCHIVE_COMPRESSION", "gzip")
+            )
+            if archive_path
+            else None
+        )
+        crawler.signals.connect(
+            spider.request_reached_downloader, signal=signals.request_reached_downloader
+        )
+        # a page's fingerprint is only saved once its item is stored: written to MySQL
+        # when MysqlPipline announces itself, past every pipeline otherwise
+        crawler.signals.connect(spider.store_opened, signal=store_opened)
+        crawler.signals.connect(spider.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(spider.item_saved, signal=item_stored)
+        crawler.signals.connect(spider.item_lost, signal=signals.item_dropped)
+        crawler.signals.connect(spider.item_lost, signal=signals.item_error)
+        return spider
 
     @override
     def start_requests(self):
-        for slug in self.slugs:
-            yield scrapy.Request(f"{self.host}{slug}", meta={"playwright": True})
+        # slugs left queued, in flight or failed by a crawl that was killed come first,
+        # seeds that are already done are not fetched again. A crawl that finished
+        # reset the frontier, the next one starts over.
+        unfinished = self.frontier.unfinished()
+        if unfinished:
+            self.logger.info(f"frontier -> resuming {len(unfinished)} unfinished slugs")
+        for slug in unfinished:
+            base_item = self.frontier.base_item(slug)
+            # slugs claimed before the frontier kept base_game are taken for base games
+            yield self.slug_request(
+                slug,
+                priority=self.priority(slug, base_game=self.frontier.base_game(slug) is not False),
+                cb_kwargs={"item": base_item} if base_item else None,
+            )
+        # consumed lazily by the engine, seeds reach the scheduler as it drains
+        for seed in self.seeds():
+            if not self.schedule(seed.slug, seed.base_item, seed.base_game):
+                continue
+            self.crawler.stats.inc_value("seeds/scheduled")
+            yield self.slug_request(
+                seed.slug,
+                priority=self.priority(seed.slug, base_game=seed.base_game),
+                cb_kwargs={"item": seed.base_item} if seed.base_item else None,
+            )
+
+    def seeds(self) -> Iterator[Seed]:
+        path = self.seed_path or self.settings.get("SEED_PATH")
+        if path:
+            self.logger.info(f"seeds -> reading {path}")
+            return read_seeds(path)
+        return (Seed(canonical_slug(slug)) for slug in self.settings.getlist("SEED_SLUGS"))
+
+    def priority(self, slug: str, base_game: bool) -> int:
+        """Scheduler priority of a slug. Base games go before add-ons, so a base item is
+        written before the add-ons mapped to it, and slugs never fetched or not fetched
+        for SEED_STALE_AFTER seconds go before fresh ones."""
+        priority = self.settings.getint("SEED_BASE_GAME_PRIORITY", 20) if base_game else 0
+        last_fetched = self.frontier.last_fetched.get(slug)
+        stale_after = self.settings.getfloat("SEED_STALE_AFTER", 24 * 60 * 60)
+        if last_fetched is None or time.time() - last_fetched > stale_after:
+            priority += self.settings.getint("SEED_STALE_PRIORITY", 10)
+        return priority
+
+    def closed(self, reason: str):
+        # only an interrupted crawl resumes, a finished one leaves every slug done
+        if reason == "finished":
+            self.frontier.reset()
+        self.parse_pool.close()
+        self.frontier.close()
+        if self.payloads is not None:
+            self.payloads.close()
 
     @override
-    def parse(self, response: Response, **kwargs: Any):
-        parser = ItemParser1(self.logger, self.scrapped_slugs)
-        item = parser.parse(response)
+    async def parse(self, response: Response, **kwargs: Any):
+        rendered = bool(response.meta.get("playwright"))
+        self.crawler.stats.inc_value(
+            "hybrid/playwright_responses" if rendered else "hybrid/http_responses"
+        )
+        parser = ItemParser1(
+            self.logger,
+            self.frontier,
+            decode_queries=get_decoder(self.settings.get("JSON_BACKEND", "stdlib")),
+            stats=self.crawler.stats,
+            archive=self.payloads,
+        )
+        slug = response.meta.get("slug") or canonical_slug(response.url)
+        if self.settings.getbool("SKIP_UNCHANGED_PAGES"):
+            parser.fingerprint_pages = True
+            parser.known_fingerprint = self.frontier.fingerprint(slug)
+        try:
+            item = await self.parse_pool.parse(parser, response)
+        except QueriesNotFound as err:
+            if rendered:
+                self.logger.error(f"parse {response.url} -> {err}")
+                self.frontier.mark(slug, FAILED, fetched=True)
+                return
+            self.logger.info(
+                f"parse {response.url} -> {err} (status {response.status}), retrying with playwright"
+            )
+            self.crawler.stats.inc_value("hybrid/playwright_fallbacks")
+            yield self.playwright_fallback(cast(scrapy.Request, response.request))
+            return
+        # the mappings are claimed as queued before the page is marked done, a crawl
+        # killed in between resumes them instead of losing them
+        requests = list(self.next_request(item)) if item else []
+        if slug in self.frontier:
+            self.frontier.mark(slug, DONE, fetched=True)
+        if item and parser.fingerprint and not parser.unchanged:
+            self.unsaved_fingerprints[fingerprint_key(item)] = (slug, parser.fingerprint)
+        if item and parser.known_fingerprint:
+            self.crawler.stats.inc_value(
+                "fingerprint/unchanged" if parser.unchanged else "fingerprint/changed"
+            )
+        if item and self.payloads is not None and parser.payload_digest:
+            self.payloads.record(slug, parser.payload_digest, response.url, item.get("base_item"))
 
         yield item
-        if item:
-            yield from self.next_request(item)
+        for request in requests:
+            yield request
+
+    def schedule(
+        self, slug: str, base_item: Optional[ItemRef] = None, base_game: Optional[bool] = None
+    ) -> bool:
+        """Claim a slug for this crawl. Slugs are marked when they are scheduled rather
+        than when their response is parsed, so sibling DLC pages listing the same
+        mappings don't queue each other again while the first request is in flight."""
+        if slug in self.frontier:
+            self.crawler.stats.inc_value("dedup/dropped_slugs")
+            return False
+        self.frontier.mark(slug, QUEUED, base_item=base_item, base_game=base_game)
+        return True
+
+    def store_opened(self):
+        self.stored_by_pipeline = True
+
+    def item_scraped(self, item: Any):
+        if not self.stored_by_pipeline:
+            self.item_saved(item)
+
+    def item_saved(self, item: Any):
+        # only a GameItem has a fingerprint waiting to be saved
+        if not isinstance(item, GameItem):
+            return
+        unsaved = self.unsaved_fingerprints.pop(fingerprint_key(item), None)
+        if unsaved is not None:
+            self.frontier.save_fingerprint(*unsaved)
+
+    def item_lost(self, item: Any):
+        if isinstance(item, GameItem):
+            __ = self.unsaved_fingerprints.pop(fingerprint_key(item), None)
+
+    def request_reached_downloader(self, request: scrapy.Request, spider: scrapy.Spider):
+        slug = request.meta.get("slug")
+        if spider is self and slug:
+            self.frontier.mark(slug, IN_FLIGHT)
+
+    def download_failed(self, failure: Failure):
+        request = cast(scrapy.Request, getattr(failure, "request", None))
+        if request and request.meta.get("playwright") is False and not failure.check(HttpError):
+            # the plain HTTP attempt isn't retried, the rendered one is
+            self.logger.info(
+                f"download {request.url} -> {failure.getErrorMessage()}, retrying with playwright"
+            )
+            self.crawler.stats.inc_value("hybrid/playwright_fallbacks")
+            return self.playwright_fallback(request)
+        slug = request and request.meta.get("slug")
+        self.logger.error(f"download {request and request.url} -> {failure.getErrorMessage()}")
+        if slug:
+            self.frontier.mark(slug, FAILED, fetched=True)
+
+    def slug_request(self, slug: str, **kwargs: Any):
+        return scrapy.Request(
+            f"{self.host}{slug}",
+            meta={**self.download_meta(), "slug": slug},
+            errback=self.download_failed,
+            **kwargs,
+        )
+
+    def download_meta(self) -> dict[str, Any]:
+        # With HYBRID_DOWNLOAD the page is fetched by the plain HTTP handler first, the
+        # playwright handler only renders pages where the query script is missing, which
+        # includes the challenge pages of CHALLENGE_STATUSES
+        if self.settings.getbool("HYBRID_DOWNLOAD"):
+            return http_meta()
+        return self.render_meta()
+
+    def render_meta(self) -> dict[str, Any]:
+        return render_meta(self.settings.get("PLAYWRIGHT_WAIT_UNTIL", "domcontentloaded"))
+
+    def playwright_fallback(self, request: scrapy.Request):
+        return request.replace(meta={**request.meta, **self.render_meta()}, dont_filter=True)
 
     def next_request(self, item: GameItem):
         url = item.get("url")
+        parent = ItemRef.of(item)
         for mapping in item.get("mappings") or []:
-            if mapping["pageSlug"] and mapping["pageSlug"] not in self.scrapped_slugs:
-                self.slugs.append(mapping["pageSlug"])
-                self.logger.info(f"parse {url} -> following link {self.host}{mapping['pageSlug']}")
+            slug = canonical_slug(mapping["pageSlug"] or "")
+            # the base game listed among a DLC's mappings isn't an add-on of that DLC
+            base_game = is_base_game_page(mapping)
+            base_item = None if base_game else parent
+            if slug and self.schedule(slug, base_item, base_game):
+                self.logger.info(f"parse {url} -> following link {self.host}{slug}")
                 headers = {
                     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/png,image/svg+xml,*/*;q=0.8",
                     "Accept-Encoding": "gzip, deflate, br, zstd",
@@ -52,16 +280,20 @@ class GameResellerScraper(scrapy.Spider):
                     "Upgrade-Insecure-Requests": "1",
                     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:130.0) Gecko/20100101 Firefox/130.0",
                 }
-                cb_kwargs: dict[Any, Any] = {"item": item}
-                yield scrapy.Request(
-                    url=f"{self.host}{mapping['pageSlug']}",
+                cb_kwargs: dict[Any, Any] = {"item": base_item} if base_item else {}
+                yield self.slug_request(
+                    slug,
                     headers=headers,
                     callback=self.parse,
-                    meta={"playwright": True},
                     cb_kwargs=cb_kwargs,
+                    priority=self.priority(slug, base_game=base_game),
                 )
 
 
+def fingerprint_key(item: GameItem) -> tuple[Any, Any]:
+    return (item.get("ref_namespace"), item.get("ref_id"))
+
+
 """ launcherVersion
     - Nothing important, just some metadata
 """
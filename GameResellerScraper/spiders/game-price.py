@@ -0,0 +1,98 @@
+from typing import Any, Optional, cast
+from typing_extensions import override
+
+import scrapy
+
+from scrapy.http import Response
+from scrapy.spidermiddlewares.httperror import HttpError
+from twisted.python.failure import Failure
+
+from GameResellerScraper.browser import http_meta, render_meta
+from GameResellerScraper.decoders import get_decoder
+from GameResellerScraper.parser import PriceParser, QueriesNotFound
+from GameResellerScraper.prices import Identity, known_identities
+
+
+class GamePriceSpider(scrapy.Spider):
+    """Refreshes the prices of items a full crawl already stored. Pages are fetched
+    over plain HTTP, playwright only renders pages where the query script is missing,
+    and nothing but the catalog offer's price is read: no mappings are followed and
+    MysqlPipline updates sale_price in place instead of inserting items rows.
+
+    The items come from PRICE_IDENTITY_SOURCE, or `-a source=mysql|sink`."""
+
+    name = "game-price"
+    host = "https://store.epicgames.com/en-US/p/"
+    custom_settings = {
+        "ITEM_PIPELINES": {
+            "GameResellerScraper.pipelines.MysqlPipline": 310,
+            "GameResellerScraper.pipelines.PriceHistoryPipeline": 330,
+        },
+    }
+
+    def __init__(self, source: Optional[str] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.source = source
+
+    @override
+    def start_requests(self):
+        source = self.source or self.settings.get("PRICE_IDENTITY_SOURCE", "mysql")
+        identities = known_identities(source, self.settings)
+        self.logger.info(f"prices -> refreshing {len(identities)} items from {source}")
+        self.crawler.stats.set_value("prices/identities", len(identities))
+        for identity in identities:
+            yield self.price_request(identity)
+
+    def price_request(self, identity: Identity):
+        return scrapy.Request(
+            f"{self.host}{identity.ref_slug}",
+            meta=http_meta(self.settings.getbool("PRICE_PLAYWRIGHT_FALLBACK", True)),
+            cb_kwargs={"identity": identity},
+            errback=self.download_failed,
+        )
+
+    @override
+    def parse(self, response: Response, **kwargs: Any):
+        parser = PriceParser(
+            self.logger,
+            decode_queries=get_decoder(self.settings.get("JSON_BACKEND", "stdlib")),
+            stats=self.crawler.stats,
+        )
+        try:
+            item = parser.parse(response)
+        except QueriesNotFound as err:
+            if response.meta.get("playwright") or not self.settings.getbool(
+                "PRICE_PLAYWRIGHT_FALLBACK", True
+            ):
+                self.logger.error(f"prices {response.url} -> {err}")
+                self.crawler.stats.inc_value("prices/failed")
+                return
+            self.logger.info(
+                f"prices {response.url} -> {err} (status {response.status}), retrying with playwright"
+            )
+            self.crawler.stats.inc_value("prices/playwright_fallbacks")
+            yield self.playwright_fallback(cast(scrapy.Request, response.request))
+            return
+        if item:
+            yield item
+
+    def download_failed(self, failure: Failure):
+        request = cast(scrapy.Request, getattr(failure, "request", None))
+        if (
+            request
+            and request.meta.get("playwright") is False
+            and not failure.check(HttpError)
+            and self.settings.getbool("PRICE_PLAYWRIGHT_FALLBACK", True)
+        ):
+            # the plain HTTP attempt isn't retried, the rendered one is
+            self.logger.info(
+                f"prices {request.url} -> {failure.getErrorMessage()}, retrying with playwright"
+            )
+            self.crawler.stats.inc_value("prices/playwright_fallbacks")
+            return self.playwright_fallback(request)
+        self.logger.error(f"prices {request and request.url} -> {failure.getErrorMessage()}")
+        self.crawler.stats.inc_value("prices/failed")
+
+    def playwright_fallback(self, request: scrapy.Request):
+        wait_until = self.settings.get("PLAYWRIGHT_WAIT_UNTIL", "domcontentloaded")
+        return request.replace(meta={**request.meta, **render_meta(wait_until)}, dont_filter=True)
@@ -0,0 +1,160 @@
+"""msgspec Structs for the parts of the React Query payload ItemParser1 reads.
+
+Only the msgspec JSON_BACKEND imports this module, msgspec is optional. Objects the
+extractors walk through are Structs, so msgspec skips every other key while decoding;
+values the items keep as they are (images, mappings, requirements, branding) stay Any.
+Every field is optional and defaults are omitted when the Structs are turned back
+into dicts, so the extractors see the shape they would get from a plain decode.
+"""
+
+from typing import Any, Optional
+
+import msgspec
+
+
+class Node(msgspec.Struct, omit_defaults=True):
+    pass
+
+
+# getCatalogOffer: state.data.Catalog.catalogOffer
+class Tag(Node):
+    id: Any = None
+    name: Any = None
+    groupName: Any = None
+
+
+class TotalPrice(Node):
+    discountPrice: Any = None
+    originalPrice: Any = None
+    discount: Any = None
+
+
+class Price(Node):
+    totalPrice: Optional[TotalPrice] = None
+
+
+class CatalogNs(Node):
+    mappings: Any = None
+
+
+class CatalogOffer(Node):
+    title: Any = None
+    id: Any = None
+    namespace: Any = None
+    developerDisplayName: Any = None
+    description: Any = None
+    offerType: Any = None
+    publisherDisplayName: Any = None
+    tags: Optional[list[Tag]] = None
+    keyImages: Any = None
+    catalogNs: Optional[CatalogNs] = None
+    price: Optional[Price] = None
+    longDescription: Any = None
+    releaseDate: Any = None
+
+
+class Catalog(Node):
+    catalogOffer: Optional[CatalogOffer] = None
+
+
+# getProductHomeConfig and getStoreConfig: state.data.Product.sandbox.configuration
+class Configs(Node):
+    productDisplayName: Any = None
+    longDescription: Any = None
+    keyImages: Any = None
+    supportedAudio: Any = None
+    supportedText: Any = None
+    technicalRequirements: Any = None
+    theme: Any = None
+
+
+class Configuration(Node):
+    configs: Optional[Configs] = None
+
+
+class Sandbox(Node):
+    configuration: Optional[list[Configuration]] = None
+
+
+class Product(Node):
+    sandbox: Optional[Sandbox] = None
+
+
+# egs-platform: state.data.branding and state.data.criticReviews
+class Review(Node):
+    author: Any = None
+    body: Any = None
+    outlet: Any = None
+    score: Any = None
+    url: Any = None
+
+
+class Reviews(Node):
+    data: Optional[list[Review]] = None
+
+
+class CriticReviews(Node):
+    criticAverage: Any = None
+    criticRating: Any = None
+    recommendPercentage: Any = None
+    reviews: Optional[Reviews] = None
+
+
+# getProductResult: state.data.RatingsPolls.getProductResult
+class Localizations(Node):
+    text: Any = None
+    emoji: Any = None
+    resultEmoji: Any = None
+    resultTitle: Any = None
+    resultText: Any = None
+
+
+class Poll(Node):
+    id: Any = None
+    tagId: Any = None
+    pollDefinitionId: Any = None
+    localizations: Optional[Localizations] = None
+    total: Any = None
+
+
+class ProductResult(Node):
+    averageRating: Any = None
+    pollResult: Optional[list[Poll]] = None
+
+
+class RatingsPolls(Node):
+    getProductResult: Optional[ProductResult] = None
+
+
+# getMappingByPageSlug: state.data.StorePageMapping.mapping.pageSlug
+class Mapping(Node):
+    pageSlug: Any = None
+
+
+class StorePageMapping(Node):
+    mapping: Optional[Mapping] = None
+
+
+class Data(Node):
+    Catalog: Optional[Catalog] = None
+    Product: Optional[Product] = None
+    branding: Any = None
+    criticReviews: Optional[CriticReviews] = None
+    RatingsPolls: Optional[RatingsPolls] = None
+    StorePageMapping: Optional[StorePageMapping] = None
+
+
+class State(Node):
+    data: Optional[Data] = None
+
+
+class Query(msgspec.Struct):
+    """An entry of the queries list, its state is left undecoded until the queryKey
+    says it is one ItemParser1 reads"""
+
+    queryKey: Any = None
+    state: msgspec.Raw = msgspec.Raw(b"null")
+
+
+class Queries(msgspec.Struct):
+    queries: list[Query]
@@ -0,0 +1,610 @@
+"""Buffered, batched writes for MysqlPipline.
+
+Items are collected per table and written with one `executemany` per table when a
+row-count or time threshold is reached. Parent ids (items.ID for the child tables,
+systems.ID for system_details) are resolved with one SELECT per flush instead of
+reading `lastrowid` after every row. Base items of DLCs and add-ons are looked up in an
+in-memory identity map; mappings whose base hasn't been written yet are kept and
+retried on later flushes, so items can arrive in any order.
+
+Prices from the game-price spider go through the same batches as one UPDATE of
+sale_price per item, instead of a new items row.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Optional
+
+from mysql.connector.abstracts import MySQLCursorAbstract
+from scrapy.http.request.json_request import json
+
+from GameResellerScraper.items import GameItem, ItemRef, PriceItem
+from GameResellerScraper.metrics import Timings
+
+ItemKey = tuple[Optional[str], Optional[str]]
+
+ITEM_COLUMNS = (
+    "title",
+    "ref_id",
+    "ref_namespace",
+    "developer_display_name",
+    "short_description",
+    "item_type",
+    "publisher_display_name",
+    "long_description",
+    "ref_slug",
+    "critic_avg",
+    "critic_rating",
+    "critic_recommend_pct",
+    "text",
+    "audio",
+    "sale_price",
+    "release_date",
+    "avg_rating",
+)
+INSERT_ITEM = (
+    "INSERT INTO items "
+    "(" + ", ".join(ITEM_COLUMNS) + ") "
+    "VALUES (" + ", ".join(["%s"] * len(ITEM_COLUMNS)) + ")"
+)
+UPDATE_ITEM = (
+    "UPDATE items SET " + ", ".join(f"{column} = %s" for column in ITEM_COLUMNS) + " WHERE ID = %s"
+)
+INSERT_IMAGE = (
+    "INSERT INTO images "
+    "(url, image_type, alt, item_id, image_row) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+INSERT_SYSTEM = "INSERT INTO systems " + "(os, item_id) " + "VALUES (%s, %s)"
+INSERT_SYSTEM_DETAIL = (
+    "INSERT INTO system_details "
+    "(title, minimum, recommended, system_id) "
+    "VALUES (%s, %s, %s, %s)"
+)
+INSERT_REVIEW = (
+    "INSERT INTO reviews "
+    "(author, body, outlet, earned_score, total_score, type, item_id, url) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+)
+INSERT_POLL = (
+    "INSERT INTO polls "
+    "(text, emoji, result_emoji, result_title, result_text, item_id, ref_id, ref_tag_id, ref_poll_definition_id, total) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+)
+INSERT_MAPPING = "INSERT INTO item_mappings " + "(item_id, base_item_id)" + "VALUES (%s, %s)"
+# sale_price is the origin price, as written by INSERT_ITEM
+UPDATE_PRICE = "UPDATE items SET sale_price = %s WHERE ref_namespace = %s AND ref_id = %s"
+
+# Incremental mode keeps one content hash per item part, the items row itself and each
+# child collection, so a recrawl only rewrites what changed
+CREATE_HASHES = (
+    "CREATE TABLE IF NOT EXISTS item_hashes ("
+    "ref_namespace VARCHAR(64) NOT NULL, "
+    "ref_id VARCHAR(64) NOT NULL, "
+    "part VARCHAR(32) NOT NULL, "
+    "hash CHAR(40) NOT NULL, "
+    "PRIMARY KEY (ref_namespace, ref_id, part))"
+)
+REPLACE_HASH = (
+    "REPLACE INTO item_hashes " "(ref_namespace, ref_id, part, hash) " "VALUES (%s, %s, %s, %s)"
+)
+ITEM_PART = "item"
+CHILD_PARTS = ("images", "reviews", "polls", "technical_requirements")
+ALL_PARTS = (ITEM_PART,) + CHILD_PARTS
+DELETE_PART = {
+    "images": ("DELETE FROM images WHERE item_id IN ({})",),
+    "reviews": ("DELETE FROM reviews WHERE item_id IN ({})",),
+    "polls": ("DELETE FROM polls WHERE item_id IN ({})",),
+    "technical_requirements": (
+        "DELETE FROM system_details WHERE system_id IN "
+        "(SELECT ID FROM systems WHERE item_id IN ({}))",
+        "DELETE FROM systems WHERE item_id IN ({})",
+    ),
+}
+
+# Keep the IN (...) lists of the id lookups well below max_allowed_packet
+SELECT_CHUNK = 500
+
+
+class IdentityMap:
+    """Bounded LRU of items.ID by (ref_namespace, ref_id), filled from the ids each
+    flush gives its items"""
+
+    ids: "OrderedDict[ItemKey, int]"
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self.ids = OrderedDict()
+
+    def get(self, key: ItemKey) -> Optional[int]:
+        item_id = self.ids.get(key)
+        if item_id is not None:
+            self.ids.move_to_end(key)
+        return item_id
+
+    def update(self, ids: dict[ItemKey, int]):
+        for key, item_id in ids.items():
+            self.ids[key] = item_id
+            self.ids.move_to_end(key)
+        while len(self.ids) > self.max_size:
+            __ = self.ids.popitem(last=False)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Batch:
+    """What one flush writes. Built on the reactor thread by BufferedWriter.take so the
+    flush itself, running on a pool thread, doesn't touch shared state."""
+
+    __slots__ = ("items", "base_ids", "mappings", "prices", "final")
+
+    items: list[GameItem]
+    # ids the identity map already knows for the bases this batch needs
+    base_ids: dict[ItemKey, int]
+    # (item_id, base key) mappings left unresolved by earlier flushes
+    mappings: list[tuple[int, ItemKey]]
+    # UPDATE_PRICE rows
+    prices: list[tuple[Any, ...]]
+    # last flush of the crawl: look up bases that are still unknown in the database
+    final: bool
+
+    def __init__(
+        self,
+        items: list[GameItem],
+        base_ids: dict[ItemKey, int],
+        mappings: list[tuple[int, ItemKey]],
+        final: bool = False,
+        prices: Optional[list[tuple[Any, ...]]] = None,
+    ):
+        self.items = items
+        self.base_ids = base_ids
+        self.mappings = mappings
+        self.prices = prices or []
+        self.final = final
+
+    def __bool__(self):
+        return bool(self.items or self.mappings or self.prices)
+
+
+class FlushResult:
+    __slots__ = ("ids", "unresolved", "new", "updated", "unchanged", "prices", "timings")
+
+    ids: dict[ItemKey, int]
+    unresolved: list[tuple[int, ItemKey]]
+    new: int
+    updated: int
+    unchanged: int
+    prices: int
+    # time spent in each statement of the flush, recorded by the pipeline
+    timings: Timings
+
+    def __init__(self, ids: dict[ItemKey, int], unresolved: list[tuple[int, ItemKey]]):
+        self.ids = ids
+        self.unresolved = unresolved
+        self.new = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.prices = 0
+        self.timings = Timings()
+
+
+class BufferedWriter:
+    pending: dict[ItemKey, GameItem]
+    pending_prices: dict[ItemKey, tuple[Any, ...]]
+    row_count: int
+    first_buffered_at: Optional[float]
+    identity: IdentityMap
+    deferred_mappings: list[tuple[int, ItemKey]]
+
+    def __init__(
+        self,
+        max_rows: int = 1000,
+        max_delay: float = 5.0,
+        cache_size: int = 100_000,
+        incremental: bool = False,
+    ):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.incremental = incremental
+        self.pending = {}
+        self.pending_prices = {}
+        self.row_count = 0
+        self.first_buffered_at = None
+        self.identity = IdentityMap(cache_size)
+        self.deferred_mappings = []
+
+    def add(self, item: GameItem):
+        key = item_key(item)
+        if key in self.pending:
+            # the same offer twice in one batch, the newest copy wins
+            self.row_count -= count_rows(self.pending.pop(key))
+        self.pending[key] = item
+        self.row_count += count_rows(item)
+        if self.first_buffered_at is None:
+            self.first_buffered_at = time.monotonic()
+
+    def add_price(self, item: PriceItem):
+        key = item_key(item)
+        if key not in self.pending_prices:
+            self.row_count += 1
+        self.pending_prices[key] = price_row(item)
+        if self.first_buffered_at is None:
+            self.first_buffered_at = time.monotonic()
+
+    def due(self) -> bool:
+        if not self.pending and not self.pending_prices:
+            return False
+        if self.row_count >= self.max_rows:
+            return True
+        return (
+            self.first_buffered_at is not None
+            and time.monotonic() - self.first_buffered_at >= self.max_delay
+        )
+
+    def take(self, final: bool = False) -> Batch:
+        items = list(self.pending.values())
+        prices = list(self.pending_prices.values())
+        mappings = self.deferred_mappings
+        self.pending = {}
+        self.pending_prices = {}
+        self.row_count = 0
+        self.first_buffered_at = None
+        self.deferred_mappings = []
+
+        base_keys = [base_key(item) for item in items if item.get("base_item")]
+        base_keys.extend(key for _, key in mappings)
+        base_ids: dict[ItemKey, int] = {}
+        for key in base_keys:
+            item_id = self.identity.get(key)
+            if item_id is not None:
+                base_ids[key] = item_id
+        return Batch(items, base_ids, mappings, final, prices)
+
+    def complete(self, result: FlushResult):
+        """Record a committed flush, back on the reactor thread"""
+        self.identity.update(result.ids)
+        self.deferred_mappings.extend(result.unresolved)
+
+    def flush(self, cursor: MySQLCursorAbstract, batch: Batch) -> FlushResult:
+        """Write the batch and its child rows. The caller owns the transaction: commit
+        after, roll back on error."""
+        # one write per key, the newest copy wins: two copies would both be new to diff
+        items = list({item_key(item): item for item in batch.items}.values())
+        result = FlushResult({}, [])
+        timings = result.timings
+        # parts of each item to write, every part for items that aren't stored yet
+        writes: list[tuple[GameItem, set[str]]] = [(item, set(ALL_PARTS)) for item in items]
+        hash_rows: list[tuple[Any, ...]] = []
+        if self.incremental and items:
+            with timings.measure("diff"):
+                writes, hash_rows = self.diff(cursor, items, result)
+        else:
+            result.new = len(items)
+
+        new_items = [item for item, parts in writes if ITEM_PART in parts]
+        new_keys = {item_key(item) for item in new_items}
+        if new_items:
+            with timings.measure("insert_items"):
+                __ = cursor.executemany(INSERT_ITEM, [item_row(item) for item in new_items])
+            with timings.measure("select_item_ids"):
+                result.ids.update(select_item_ids(cursor, [item_key(item) for item in new_items]))
+        ids = result.ids
+
+        images: list[tuple[Any, ...]] = []
+        reviews: list[tuple[Any, ...]] = []
+        polls: list[tuple[Any, ...]] = []
+        systems: list[tuple[Any, ...]] = []
+        mappings: list[tuple[int, ItemKey]] = list(batch.mappings)
+        for item, parts in writes:
+            item_id = ids.get(item_key(item))
+            if item_id is None:
+                continue
+            if "images" in parts:
+                images.extend(image_rows(item, item_id))
+            if "reviews" in parts:
+                reviews.extend(review_rows(item, item_id))
+            if "polls" in parts:
+                polls.extend(poll_rows(item, item_id))
+            if "technical_requirements" in parts:
+                systems.extend((os, item_id) for os in system_details(item))
+            if item_key(item) in new_keys and item.get("base_item"):
+                mappings.append((item_id, base_key(item)))
+
+        # bases come from this batch, then the identity map. Whatever is left waits for
+        # a later flush, only the final one falls back to querying the database
+        known = {**batch.base_ids, **ids}
+        if batch.final:
+            missing = [key for _, key in mappings if key not in known]
+            if missing:
+                with timings.measure("select_item_ids"):
+                    known.update(select_item_ids(cursor, missing))
+        mapping_rows: list[tuple[Any, ...]] = []
+        for item_id, key in mappings:
+            base_item_id = known.get(key)
+            if base_item_id is None:
+                result.unresolved.append((item_id, key))
+            else:
+                mapping_rows.append((item_id, base_item_id))
+
+        with timings.measure("insert_images"):
+            executemany(cursor, INSERT_IMAGE, images)
+        with timings.measure("insert_reviews"):
+            executemany(cursor, INSERT_REVIEW, reviews)
+        with timings.measure("insert_polls"):
+            executemany(cursor, INSERT_POLL, polls)
+        with timings.measure("insert_mappings"):
+            executemany(cursor, INSERT_MAPPING, mapping_rows)
+        if systems:
+            with timings.measure("insert_systems"):
+                executemany(cursor, INSERT_SYSTEM, systems)
+                system_ids = select_system_ids(cursor, list({row[1] for row in systems}))
+            details: list[tuple[Any, ...]] = []
+            for item, parts in writes:
+                if "technical_requirements" not in parts:
+                    continue
+                item_id = ids.get(item_key(item))
+                for os, rows in system_details(item).items():
+                    system_id = system_ids.get((item_id, os))
+                    if system_id is None:
+                        continue
+                    details.extend(row + (system_id,) for row in rows)
+            with timings.measure("insert_system_details"):
+                executemany(cursor, INSERT_SYSTEM_DETAIL, details)
+        if hash_rows:
+            with timings.measure("replace_hashes"):
+                executemany(cursor, REPLACE_HASH, hash_rows)
+        if batch.prices:
+            with timings.measure("update_prices"):
+                executemany(cursor, UPDATE_PRICE, batch.prices)
+            result.prices = len(batch.prices)
+
+        return result
+
+    def diff(
+        self, cursor: MySQLCursorAbstract, items: list[GameItem], result: FlushResult
+    ) -> tuple[list[tuple[GameItem, set[str]]], list[tuple[Any, ...]]]:
+        """Compare each item's content hashes with the stored ones. Stored items are
+        updated in place, changed child collections are deleted so they can be
+        rewritten, and unchanged ones are left alone."""
+        keys = [item_key(item) for item in items]
+        existing = select_item_ids(cursor, keys)
+        stored = select_hashes(cursor, keys)
+
+        writes: list[tuple[GameItem, set[str]]] = []
+        hash_rows: list[tuple[Any, ...]] = []
+        updates: list[tuple[Any, ...]] = []
+        replaced: dict[str, list[int]] = {part: [] for part in CHILD_PARTS}
+        for item in items:
+            key = item_key(item)
+            hashes = content_hashes(item)
+            item_id = existing.get(key)
+            if item_id is None:
+                changed = set(hashes)
+                result.new += 1
+            else:
+                result.ids[key] = item_id
+                changed = {
+                    part for part, digest in hashes.items() if stored.get((key, part)) != digest
+                }
+                if not changed:
+                    result.unchanged += 1
+                    continue
+                result.updated += 1
+                if ITEM_PART in changed:
+                    updates.append(item_row(item) + (item_id,))
+                    changed.discard(ITEM_PART)
+                for part in changed:
+                    replaced[part].append(item_id)
+            writes.append((item, changed))
+            hash_rows.extend(key + (part, hashes[part]) for part in hashes)
+
+        executemany(cursor, UPDATE_ITEM, updates)
+        for part, item_ids in replaced.items():
+            for i in range(0, len(item_ids), SELECT_CHUNK):
+                chunk = item_ids[i : i + SELECT_CHUNK]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                for query in DELETE_PART[part]:
+                    __ = cursor.execute(query.format(placeholders), chunk)
+        return writes, hash_rows
+
+
+def executemany(cursor: MySQLCursorAbstract, operation: str, rows: list[tuple[Any, ...]]):
+    if rows:
+        __ = cursor.executemany(operation, rows)
+
+
+def select_item_ids(cursor: MySQLCursorAbstract, keys: list[ItemKey]) -> dict[ItemKey, int]:
+    """Newest items.ID per (ref_namespace, ref_id)"""
+    keys = list({key for key in keys if None not in key})
+    ids: dict[ItemKey, int] = {}
+    for i in range(0, len(keys), SELECT_CHUNK):
+        chunk = keys[i : i + SELECT_CHUNK]
+        query = (
+            "SELECT MAX(ID) AS ID, ref_namespace, ref_id FROM items "
+            "WHERE (ref_namespace, ref_id) IN (" + ", ".join(["(%s, %s)"] * len(chunk)) + ") "
+            "GROUP BY ref_namespace, ref_id"
+        )
+        __ = cursor.execute(query, [value for key in chunk for value in key])
+        for row in cursor.fetchall():
+            item_id, ref_namespace, ref_id = row_values(row, "ID", "ref_namespace", "ref_id")
+            ids[(ref_namespace, ref_id)] = item_id
+    return ids
+
+
+def select_system_ids(
+    cursor: MySQLCursorAbstract, item_ids: list[int]
+) -> dict[tuple[Optional[int], str], int]:
+    ids: dict[tuple[Optional[int], str], int] = {}
+    for i in range(0, len(item_ids), SELECT_CHUNK):
+        chunk = item_ids[i : i + SELECT_CHUNK]
+        query = (
+            "SELECT ID, item_id, os FROM systems WHERE item_id IN ("
+            + ", ".join(["%s"] * len(chunk))
+            + ")"
+        )
+        __ = cursor.execute(query, chunk)
+        for row in cursor.fetchall():
+            system_id, item_id, os = row_values(row, "ID", "item_id", "os")
+            ids[(item_id, os)] = system_id
+    return ids
+
+
+def select_hashes(
+    cursor: MySQLCursorAbstract, keys: list[ItemKey]
+) -> dict[tuple[ItemKey, str], str]:
+    keys = list({key for key in keys if None not in key})
+    hashes: dict[tuple[ItemKey, str], str] = {}
+    for i in range(0, len(keys), SELECT_CHUNK):
+        chunk = keys[i : i + SELECT_CHUNK]
+        query = (
+            "SELECT ref_namespace, ref_id, part, hash FROM item_hashes "
+            "WHERE (ref_namespace, ref_id) IN (" + ", ".join(["(%s, %s)"] * len(chunk)) + ")"
+        )
+        __ = cursor.execute(query, [value for key in chunk for value in key])
+        for row in cursor.fetchall():
+            ref_namespace, ref_id, part, digest = row_values(
+                row, "ref_namespace", "ref_id", "part", "hash"
+            )
+            hashes[((ref_namespace, ref_id), part)] = digest
+    return hashes
+
+
+def content_hashes(item: GameItem) -> dict[str, str]:
+    """Stable hash of the items row and of each child collection"""
+    return {
+        ITEM_PART: stable_hash(item_row(item)),
+        "images": stable_hash(item.get("images")),
+        "reviews": stable_hash(item.get("critic_reviews")),
+        "polls": stable_hash(item.get("polls")),
+        "technical_requirements": stable_hash(item.get("technical_requirements")),
+    }
+
+
+def stable_hash(value: Any) -> str:
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+def row_values(row: Any, *columns: str) -> tuple[Any, ...]:
+    if type(row) == dict:
+        return tuple(row.get(column) for column in columns)
+    return tuple(row)
+
+
+def item_key(item: GameItem) -> ItemKey:
+    return (item.get("ref_namespace"), item.get("ref_id"))
+
+
+def base_key(item: GameItem) -> ItemKey:
+    base_item: Optional[ItemRef] = item.get("base_item")
+    if base_item is None:
+        return (None, None)
+    return (base_item.ref_namespace, base_item.ref_id)
+
+
+def count_rows(item: GameItem) -> int:
+    details = system_details(item)
+    return (
+        1
+        + len(item.get("images") or [])
+        + len(item.get("critic_reviews") or [])
+        + len(item.get("polls") or [])
+        + len(details)
+        + sum(len(rows) for rows in details.values())
+        + (1 if item.get("base_item") else 0)
+    )
+
+
+def item_row(item: GameItem) -> tuple[Any, ...]:
+    return (
+        item.get("title"),
+        item.get("ref_id"),
+        item.get("ref_namespace"),
+        item.get("developer_display_name"),
+        item.get("short_description"),
+        item.get("item_type"),
+        item.get("publisher_display_name"),
+        item.get("long_description"),
+        item.get("ref_slug"),
+        item.get("critic_avg"),
+        item.get("critic_rating"),
+        item.get("critic_recommend_pct"),
+        ",".join(item.get("supported_text") or []),
+        ",".join(item.get("supported_audio") or []),
+        (item.get("price") or {}).get("origin_price") or 0,
+        datetime.strptime(
+            item.get("release_date") or "2023-01-25T06:00:00.000Z", "%Y-%m-%dT%H:%M:%S.%fZ"
+        ),
+        item.get("avg_rating"),
+    )
+
+
+def price_row(item: PriceItem) -> tuple[Any, ...]:
+    return (item.get("origin_price") or 0, item.get("ref_namespace"), item.get("ref_id"))
+
+
+def image_rows(item: GameItem, item_id: int) -> list[tuple[Any, ...]]:
+    return [
+        (image.get("url"), image.get("type"), image.get("alt"), item_id, None)
+        for image in item.get("images") or []
+    ]
+
+
+def system_details(item: GameItem) -> dict[str, list[tuple[Any, ...]]]:
+    """system_details rows per os, without the system_id that is only known after the
+    systems rows are written"""
+    technical_requirements = item.get("technical_requirements")
+    if not technical_requirements:
+        return {}
+    systems: dict[str, list[tuple[Any, ...]]] = {}
+    for system_name, details in technical_requirements.items():
+        if not details:
+            continue
+        systems[system_name] = [
+            (detail.get("title"), detail.get("minimum"), detail.get("recommended"))
+            for detail in details
+        ]
+    return systems
+
+
+def review_rows(item: GameItem, item_id: int) -> list[tuple[Any, ...]]:
+    rows: list[tuple[Any, ...]] = []
+    for review in item.get("critic_reviews") or []:
+        rows.append(
+            (
+                review.get("author"),
+                review.get("body"),
+                review.get("outlet"),
+                review.get("score").get("earned_score"),
+                review.get("score").get("total_score"),
+                (
+                    "star"
+                    if review.get("score").get("type") == "CriticReviewNumericScore"
+                    else "numeric"
+                ),
+                item_id,
+                review.get("url"),
+            )
+        )
+    return rows
+
+
+def poll_rows(item: GameItem, item_id: int) -> list[tuple[Any, ...]]:
+    return [
+        (
+            poll.get("text"),
+            poll.get("emoji"),
+            poll.get("result_emoji"),
+            poll.get("result_title"),
+            poll.get("result_text"),
+            item_id,
+            poll.get("ref_id"),
+            poll.get("ref_tag_id"),
+            poll.get("ref_poll_definition_id"),
+            poll.get("total"),
+        )
+        for poll in item.get("polls") or []
+    ]
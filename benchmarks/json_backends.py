@@ -0,0 +1,58 @@
+"""Compare the JSON_BACKEND decoders on a corpus of React Query payloads.
+
+    python -m benchmarks.json_backends [corpus_dir] [--repeat N]
+
+The corpus defaults to the fixtures in GameResellerScraper/test. Backends whose
+package is not installed are reported as skipped.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from GameResellerScraper.decoders import BACKENDS
+
+DEFAULT_CORPUS = Path(__file__).parent.parent / "GameResellerScraper" / "test"
+
+
+def load_corpus(directory: Path) -> list[bytes]:
+    return [p.read_bytes() for p in sorted(directory.glob("*.json"))]
+
+
+def bench(decode, corpus: list[bytes], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for payload in corpus:
+            _ = decode(memoryview(payload))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    _ = parser.add_argument("corpus", nargs="?", type=Path, default=DEFAULT_CORPUS)
+    _ = parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        parser.error(f"no *.json payloads in {args.corpus}")
+    total_mb = sum(len(payload) for payload in corpus) * args.repeat / 1024 / 1024
+    print(f"{len(corpus)} payloads x {args.repeat}, {total_mb:.1f} MB")
+
+    baseline = None
+    for name, decode in BACKENDS.items():
+        try:
+            _ = bench(decode, corpus[:1], 1)  # warm up imports and cached decoders
+            elapsed = bench(decode, corpus, args.repeat)
+        except ImportError as err:
+            print(f"{name:>8}: skipped ({err})")
+            continue
+        baseline = baseline or elapsed
+        print(
+            f"{name:>8}: {elapsed * 1000 / (len(corpus) * args.repeat):8.3f} ms/page "
+            f"{total_mb / elapsed:8.1f} MB/s {baseline / elapsed:6.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
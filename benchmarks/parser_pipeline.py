@@ -0,0 +1,377 @@
+"""Benchmark ItemParser1 and the item pipelines on a corpus of recorded pages.
+
+    python -m benchmarks.parser_pipeline [corpus] [--repeat N] [--items N]
+        [--backend NAME] [--output FILE] [--compare FILE] [--tolerance T]
+
+The corpus is a directory of React Query JSON dumps (*.json, wrapped in a minimal page),
+recorded pages (*.html) or an HTTP archive written by HttpArchiveMiddleware. It
+defaults to the fixtures in GameResellerScraper/test.
+
+Reports pages/sec of ItemParser1.parse, p50/p99 latency of every extract_* method,
+traced memory per page, and item throughput of MysqlPipline (against the SQLite
+stand-in in benchmarks/standin.py) and GameItemPipeline. Results are written as JSON;
+with --compare the run fails when a throughput drops or a p99 grows by more than the
+tolerance.
+"""
+
+import argparse
+import dataclasses
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from scrapy import Spider
+from scrapy.http import HtmlResponse
+
+from GameResellerScraper import parser as parser_module
+from GameResellerScraper.archive import ResponseArchive
+from GameResellerScraper.decoders import get_decoder
+from GameResellerScraper.items import GameItem, ItemRef
+from GameResellerScraper.parser import REACT_QUERY_MARKER_BYTES, ItemParser1
+from GameResellerScraper.pipelines import GameItemPipeline, MysqlPipline
+from benchmarks.standin import SqlitePool, row_counts
+
+DEFAULT_CORPUS = Path(__file__).parent.parent / "GameResellerScraper" / "test"
+DEFAULT_OUTPUT = Path(__file__).parent / "results"
+PRODUCT_URL = "https://store.epicgames.com/en-US/p/{}"
+
+Page = tuple[str, bytes]
+
+
+def load_corpus(directory: Path) -> list[Page]:
+    if (directory / "index.jsonl").exists():
+        archive = ResponseArchive(str(directory))
+        pages: list[Page] = []
+        for key in archive.index:
+            record = archive.get(key)
+            if record and REACT_QUERY_MARKER_BYTES in record[1]:
+                pages.append((record[0]["url"], record[1]))
+        archive.close()
+        return pages
+
+    pages = []
+    for p in sorted(directory.iterdir()):
+        if p.suffix == ".json":
+            pages.append((PRODUCT_URL.format(p.stem), wrap_payload(p.read_bytes())))
+        elif p.suffix == ".html":
+            pages.append((PRODUCT_URL.format(p.stem), p.read_bytes()))
+    return pages
+
+
+def wrap_payload(payload: bytes) -> bytes:
+    """A page whose only script assigns `payload`, as the store's server render does"""
+    return (
+        b"<html><head><script>window."
+        + REACT_QUERY_MARKER_BYTES
+        + b" = "
+        + payload
+        + b";</script></head><body></body></html>"
+    )
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(samples: list[float]) -> dict[str, Any]:
+    return {
+        "calls": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples, default=0.0) * 1000,
+    }
+
+
+def timed(method: Callable[..., Any], samples: list[float]):
+    def wrapper(*args: Any, **kwargs: Any):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def quiet_logger() -> logging.Logger:
+    logger = logging.getLogger("benchmarks.parser")
+    logger.setLevel(logging.ERROR)
+    return logger
+
+
+def make_parser(backend: str) -> ItemParser1:
+    return ItemParser1(quiet_logger(), decode_queries=get_decoder(backend))
+
+
+def bench_parser(pages: list[Page], repeat: int, backend: str) -> dict[str, Any]:
+    responses = [HtmlResponse(url=url, body=body) for url, body in pages]
+    parser = make_parser(backend)
+    for response in responses:  # warm up imports, caches and decoders
+        __ = parser.parse(response)
+
+    samples: dict[str, list[float]] = {}
+    for name in dir(ItemParser1):
+        if name.startswith("extract_"):
+            samples[name] = []
+            setattr(parser, name, timed(getattr(parser, name), samples[name]))
+
+    page_samples: list[float] = []
+    items = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for response in responses:
+            page_start = time.perf_counter()
+            item = parser.parse(response)
+            page_samples.append(time.perf_counter() - page_start)
+            items += item is not None
+    elapsed = time.perf_counter() - start
+
+    return {
+        "pages": len(page_samples),
+        "items": items,
+        "seconds": elapsed,
+        "pages_per_sec": len(page_samples) / elapsed,
+        "page": summarize(page_samples),
+        "methods": {name: summarize(s) for name, s in samples.items() if s},
+    }
+
+
+def bench_allocations(pages: list[Page], backend: str) -> dict[str, Any]:
+    """Traced memory of one parse per page: the peak while parsing and what the item
+    keeps alive afterwards. Run separately, tracemalloc slows everything down."""
+    responses = [HtmlResponse(url=url, body=body) for url, body in pages]
+    parser = make_parser(backend)
+    __ = parser.parse(responses[0])
+    peaks: list[float] = []
+    retained: list[float] = []
+    tracemalloc.start()
+    try:
+        for response in responses:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            item = parser.parse(response)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+            del item
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "peak_kb_p50": percentile(peaks, 50) / 1024,
+        "peak_kb_max": max(peaks) / 1024,
+        "retained_kb_p50": percentile(retained, 50) / 1024,
+        "retained_kb_max": max(retained) / 1024,
+    }
+
+
+def parsed_items(pages: list[Page], backend: str) -> list[GameItem]:
+    parser = make_parser(backend)
+    items = [parser.parse(HtmlResponse(url=url, body=body)) for url, body in pages]
+    items = [item for item in items if item]
+    # the spider reaches add-ons through their base game's mappings, link them the same
+    # way when the base is part of the corpus
+    bases = {
+        item.get("ref_namespace"): item for item in items if item.get("item_type") == "BASE_GAME"
+    }
+    for item in items:
+        base = bases.get(item.get("ref_namespace"))
+        if not item.get("base_item") and base is not None and base is not item:
+            item["base_item"] = ItemRef.of(base)
+    return items
+
+
+def replicate(items: list[GameItem], count: int) -> list[GameItem]:
+    """`count` items cycling over `items`, each copy with its own ref_id and slug so the
+    writer inserts them instead of deduplicating. A copy's base item is the copy of the
+    base from the same round."""
+    copies: list[GameItem] = []
+    round_ = 0
+    while len(copies) < count:
+        suffix = f"-{round_}"
+        for item in items[: count - len(copies)]:
+            copy = GameItem(item)
+            copy["ref_id"] = f"{item.get('ref_id')}{suffix}"
+            copy["ref_slug"] = f"{item.get('ref_slug')}{suffix}"
+            base: Optional[ItemRef] = item.get("base_item")
+            if base:
+                copy["base_item"] = dataclasses.replace(base, ref_id=f"{base.ref_id}{suffix}")
+            copies.append(copy)
+        round_ += 1
+    return copies
+
+
+def bench_mysql(items: list[GameItem], workdir: Path, incremental: bool) -> dict[str, Any]:
+    spider = Spider(name="benchmark")
+    database = str(workdir / f"mysql-incremental-{incremental}.sqlite")
+    runs: list[dict[str, Any]] = []
+    # incremental mode is measured twice: the first crawl writes everything, the
+    # recrawl of the same items only compares hashes
+    for _ in range(2 if incremental else 1):
+        pipeline = MysqlPipline(incremental=incremental)
+        pipeline.dbpool = SqlitePool(database)  # pyright: ignore[reportAttributeAccessIssue]
+        __ = pipeline.open_spider(spider)
+        start = time.perf_counter()
+        for item in items:
+            __ = pipeline.process_item(item, spider)
+        __ = pipeline.close_spider(spider)
+        elapsed = time.perf_counter() - start
+        runs.append(
+            {"items": len(items), "seconds": elapsed, "items_per_sec": len(items) / elapsed}
+        )
+    rows = row_counts(database)
+
+    result = dict(runs[0])
+    if incremental:
+        result["recrawl"] = runs[1]
+    result["rows"] = rows
+    return result
+
+
+def bench_json(items: list[GameItem], workdir: Path, compression: str) -> dict[str, Any]:
+    spider = Spider(name="benchmark")
+    path = workdir / f"items-{compression}"
+    pipeline = GameItemPipeline(path=str(path), compression=compression)
+    pipeline.open_spider(spider)
+    start = time.perf_counter()
+    for item in items:
+        __ = pipeline.process_item(item, spider)
+    # includes waiting for the writer thread to write the last frame
+    pipeline.close_spider(spider)
+    elapsed = time.perf_counter() - start
+    return {
+        "items": len(items),
+        "seconds": elapsed,
+        "items_per_sec": len(items) / elapsed,
+        "bytes": sum(p.stat().st_size for p in path.glob("items-*")),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(current: dict[str, Any], previous: dict[str, Any], tolerance: float):
+    """Throughputs that dropped and p99 latencies that grew by more than `tolerance`"""
+    found: list[str] = []
+
+    def compare(path: str, higher_is_better: bool):
+        now, before = current, previous
+        for key in path.split("."):
+            now = now.get(key) if isinstance(now, dict) else None
+            before = before.get(key) if isinstance(before, dict) else None
+        if not now or not before:
+            return
+        change = (now - before) / before
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            found.append(f"{path}: {before:.3f} -> {now:.3f} ({change:+.0%})")
+
+    compare("parser.pages_per_sec", True)
+    compare("parser.page.p99_ms", False)
+    for name in current["parser"]["methods"]:
+        compare(f"parser.methods.{name}.p99_ms", False)
+    for name in current["pipelines"]:
+        compare(f"pipelines.{name}.items_per_sec", True)
+    return found
+
+
+def report(results: dict[str, Any]):
+    parser = results["parser"]
+    print(
+        f"parser: {parser['pages']} pages in {parser['seconds']:.2f}s, "
+        f"{parser['pages_per_sec']:.1f} pages/s, "
+        f"p50 {parser['page']['p50_ms']:.3f} ms, p99 {parser['page']['p99_ms']:.3f} ms"
+    )
+    for name, stats in parser["methods"].items():
+        print(f"  {name:<32} p50 {stats['p50_ms']:8.3f} ms  p99 {stats['p99_ms']:8.3f} ms")
+    memory = results["memory"]
+    print(
+        f"memory: peak {memory['peak_kb_p50']:.0f} KB/page (max {memory['peak_kb_max']:.0f}), "
+        f"retained {memory['retained_kb_p50']:.0f} KB/page"
+    )
+    for name, stats in results["pipelines"].items():
+        line = f"{name}: {stats['items']} items, {stats['items_per_sec']:.0f} items/s"
+        if "recrawl" in stats:
+            line += f", recrawl {stats['recrawl']['items_per_sec']:.0f} items/s"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    _ = parser.add_argument("corpus", nargs="?", type=Path, default=DEFAULT_CORPUS)
+    _ = parser.add_argument("--repeat", type=int, default=200)
+    _ = parser.add_argument("--items", type=int, default=2000, help="items per pipeline run")
+    _ = parser.add_argument("--backend", default="stdlib", help="JSON_BACKEND to parse with")
+    _ = parser.add_argument("--output", type=Path, help="results file, default results/<time>")
+    _ = parser.add_argument("--compare", type=Path, help="results of an earlier run")
+    _ = parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if parser_module.IS_MOCK:
+        parser.error("unset IS_MOCK, the parser would read the fixtures instead of the pages")
+    pages = load_corpus(args.corpus)
+    if not pages:
+        parser.error(f"no pages in {args.corpus}")
+    items = parsed_items(pages, args.backend)
+    if not items:
+        parser.error(f"no page of {args.corpus} parses to an item")
+    items = replicate(items, args.items)
+
+    results: dict[str, Any] = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "corpus": str(args.corpus),
+        "corpus_pages": len(pages),
+        "repeat": args.repeat,
+        "backend": args.backend,
+        "parser": bench_parser(pages, args.repeat, args.backend),
+        "memory": bench_allocations(pages, args.backend),
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        results["pipelines"] = {
+            "mysql": bench_mysql(items, Path(workdir), incremental=False),
+            "mysql_incremental": bench_mysql(items, Path(workdir), incremental=True),
+            "json": bench_json(items, Path(workdir), compression="none"),
+            "json_gzip": bench_json(items, Path(workdir), compression="gzip"),
+        }
+    report(results)
+
+    output = args.output or DEFAULT_OUTPUT / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    __ = output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"results written to {output}")
+
+    if args.compare:
+        previous = json.loads(args.compare.read_text(encoding="utf-8"))
+        found = regressions(results, previous, args.tolerance)
+        for regression in found:
+            print(f"regression {regression}")
+        if found:
+            sys.exit(1)
+        print(f"no regression against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""A SQLite stand-in for the MySQL server behind MysqlPipline.
+
+The tables mirror the MySQL schema the pipeline writes to, with SQLite types. The
+pool runs each interaction inline on the calling thread, so a benchmark measures the
+writer and the SQL it issues, not the network or the adbapi thread hand-off.
+"""
+
+import sqlite3
+from typing import Any, Callable
+
+from twisted.internet.defer import Deferred, fail, succeed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT, ref_id TEXT, ref_namespace TEXT, developer_display_name TEXT,
+    short_description TEXT, item_type TEXT, publisher_display_name TEXT,
+    long_description TEXT, ref_slug TEXT, critic_avg REAL, critic_rating TEXT,
+    critic_recommend_pct REAL, text TEXT, audio TEXT, sale_price REAL,
+    release_date TEXT, avg_rating REAL, created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS items_ref ON items (ref_namespace, ref_id);
+CREATE TABLE IF NOT EXISTS images (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT, image_type TEXT, alt TEXT, item_id INTEGER, image_row INTEGER
+);
+CREATE TABLE IF NOT EXISTS systems (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT, os TEXT, item_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS system_details (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT, minimum TEXT, recommended TEXT, system_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS reviews (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    author TEXT, body TEXT, outlet TEXT, earned_score REAL, total_score REAL,
+    type TEXT, item_id INTEGER, url TEXT
+);
+CREATE TABLE IF NOT EXISTS polls (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT, emoji TEXT, result_emoji TEXT, result_title TEXT, result_text TEXT,
+    item_id INTEGER, ref_id TEXT, ref_tag_id TEXT, ref_poll_definition_id TEXT, total INTEGER
+);
+CREATE TABLE IF NOT EXISTS item_mappings (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT, item_id INTEGER, base_item_id INTEGER
+);
+"""
+
+TABLES = (
+    "items",
+    "images",
+    "systems",
+    "system_details",
+    "reviews",
+    "polls",
+    "item_mappings",
+)
+
+
+class Cursor:
+    """Translates the mysql.connector %s placeholders to SQLite's ?"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.cursor = connection.cursor()
+
+    def execute(self, operation: str, params: Any = ()):
+        return self.cursor.execute(operation.replace("%s", "?"), tuple(params))
+
+    def executemany(self, operation: str, rows: list[Any]):
+        return self.cursor.executemany(operation.replace("%s", "?"), [tuple(row) for row in rows])
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    def close(self):
+        self.cursor.close()
+
+
+class SqlitePool:
+    """The subset of adbapi.ConnectionPool MysqlPipline uses, backed by one SQLite
+    connection. Every call returns an already fired Deferred."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.connection = sqlite3.connect(path)
+        __ = self.connection.executescript(SCHEMA)
+
+    def runInteraction(self, interaction: Callable[..., Any], *args: Any, **kwargs: Any):
+        cursor = Cursor(self.connection)
+        try:
+            result = interaction(cursor, *args, **kwargs)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            return fail()
+        finally:
+            cursor.close()
+        return succeed(result)
+
+    def runOperation(self, operation: str, *args: Any) -> Deferred:
+        return self.runInteraction(lambda cursor: cursor.execute(operation, *args))
+
+    def close(self):
+        self.connection.close()
+
+
+def row_counts(path: str) -> dict[str, int]:
+    connection = sqlite3.connect(path)
+    try:
+        return {
+            table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in TABLES
+        }
+    finally:
+        connection.close()